@@ -1,9 +1,18 @@
+import os
+import json
 from sensor import Sensor, DualSensor, GridSensor
 from node import Node
+from instrument import IngestStats
+from scheduler import Scheduler
+from summary import merge_stats
+from report import render
+from matrix import align, sensor_columns
 import urllib2
 import datetime as dt
 from ConfigParser import ConfigParser
-from constants import SENSOR_CODES, GRID_SENSOR, DATA_URI
+from constants import SENSOR_CODES, GRID_SENSOR, DATA_URI, FETCH_WORKERS
+from constants import MISSING_EXPIRY, PARSE_WORKERS
+from multiprocessing.pool import ThreadPool
 import numpy as np
 import matplotlib as mtplt
 import matplotlib.pyplot as plt
@@ -19,9 +28,42 @@ class AoT(object):
         nodes    : Dict    : Dictionary of Nodes
         strt_dte : str     : Starting date for AoT data retrieval
         stp_dte  : str     : Ending date for AoT data retrieval
+        workers  : int     : Number of parallel downloads, across all the
+                             Nodes while pulling
+        parsers  : int     : Number of processes parsing the downloaded
+                             files, 0 to parse on the download threads
+        cache    : Cache   : Optional on-disk cache shared by the Nodes
+        source   : Source  : Where the Nodes read the hourly data files
+                             from, the data host by default
+        lazy     : bool    : True if each Node only pulls data once one of
+                             its sensors is first used
+        codes    : list    : Sensor codes pulled, None for all sensors
+        missing_expiry : int : Seconds before an hour found missing upstream
+                               is asked for again
+        stats    : IngestStats : Timings, bytes, line and record counts of
+                                 the pulls of all the Nodes
+        stats_callback : function : Called with the FetchStats of each file
+                                    once a Node has ingested it
+
+    The Nodes are pulled in parallel. They share one Scheduler (either the
+    one given, or one made for the pull with workers download threads and
+    parsers processes), so the load on the data host and the CPU stays
+    capped however many Nodes there are.
     """
-    def __init__(self, nodes, dtypes=None, strt=None, stp=None):
+    def __init__(self, nodes, dtypes=None, strt=None, stp=None,
+                 workers=FETCH_WORKERS, cache=None, lazy=False, codes=None,
+                 missing_expiry=MISSING_EXPIRY, stats_callback=None,
+                 parsers=PARSE_WORKERS, scheduler=None, source=None):
         self._nodes = {}
+        self._workers = workers
+        self._parsers = parsers
+        self._scheduler = scheduler
+        self._cache = cache
+        self._source = source
+        self._lazy = lazy
+        self._codes = codes
+        self._missing_expiry = missing_expiry
+        self._stats_callback = stats_callback
         
         if strt == None and stp == None:
             today = dt.datetime.now()
@@ -57,7 +99,8 @@ class AoT(object):
     def pull_from(self, nodes, strt, stp, dtypes=None):
         """Pulls data from designated AoT nodes from the specified start time to
            the specified stop time. Optional ablity to also designate the types 
-           of data to pull.
+           of data to pull. The nodes are pulled in parallel, sharing one
+           Scheduler.
            
            :param nodes  : List of strings representing the desired nodes
            :type  nodes  : list
@@ -76,13 +119,36 @@ class AoT(object):
                         
            :rtype        : None
         """
-        for node in nodes:
-            if dtypes == None:
-               anode = Node(node, strt, stp)
-            else:
-                anode = Node(node, dtypes, strt, stp)
-                
+        def pull(node, scheduler):
+            return Node(node, dtypes, strt, stp, workers=self._workers,
+                        cache=self._cache, lazy=self._lazy,
+                        codes=self._codes,
+                        missing_expiry=self._missing_expiry,
+                        stats_callback=self._stats_callback,
+                        scheduler=scheduler, source=self._source,
+                        parsers=self._parsers)
+
+        for node, anode in zip(nodes, self._parallel(pull, nodes)):
             self._nodes[node] = anode
+
+    def _parallel(self, func, items):
+        # Call func(item, scheduler) for every item on its own thread, all
+        # sharing one Scheduler, and return the results in order. Lazy
+        # AoT objects pull nothing up front so need neither
+        if self._lazy:
+            return [func(item, None) for item in items]
+
+        scheduler = self._scheduler
+        if scheduler is None:
+            scheduler = Scheduler(self._workers, self._parsers)
+        pool = ThreadPool(max(1, len(items)))
+        try:
+            return pool.map(lambda item: func(item, scheduler), items)
+        finally:
+            pool.close()
+            pool.join()
+            if scheduler is not self._scheduler:
+                scheduler.close()
     
     @property
     def nodes(self):
@@ -95,7 +161,66 @@ class AoT(object):
     @property
     def stp_dte(self):
         return self._stp_dte                                      
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def parsers(self):
+        return self._parsers
+
+    @property
+    def scheduler(self):
+        return self._scheduler
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def missing_expiry(self):
+        return self._missing_expiry
+
+    @property
+    def stats_callback(self):
+        return self._stats_callback
+
+    @property
+    def stats(self):
+        merged = IngestStats(self._stats_callback)
+        for node in self._nodes.itervalues():
+            merged = merged.merge(node.stats)
+        return merged
     
+    def refresh(self, stp=None):
+        """Bring every Node up to date, fetching only the hours (and the
+        parts of hours) that have not been ingested yet (see Node.refresh).
+
+        :param stp : New last date from which data will be pulled, defaults
+                     to today
+        :type  stp : str
+        :return    : None
+        :rtype     : None
+        """
+        nodes = self._nodes.values()
+        self._parallel(lambda node, scheduler: node.refresh(stp, scheduler),
+                       nodes)
+        for node in nodes:
+            self._stp_dte = node.stp_dte
+
     def add(self, node):
         """Add a Node object to the AoT object.
 
@@ -105,3 +230,136 @@ class AoT(object):
         :rtype      : void
         """
         self._nodes[node._node] = node
+
+    def save(self, path):
+        """Save the AoT object to a snapshot directory: aot.json holding the
+        metadata and one Node snapshot (see Node.save) per node.
+
+        :param path : Directory to write the snapshot to
+        :type  path : str
+        :return     : None
+        :rtype      : None
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        for name, node in self._nodes.iteritems():
+            node.save(os.path.join(path, name))
+
+        meta = {'strt_dte': self._strt_dte,
+                'stp_dte': self._stp_dte,
+                'nodes': sorted(self._nodes)}
+        with open(os.path.join(path, 'aot.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r', workers=FETCH_WORKERS, cache=None,
+             missing_expiry=MISSING_EXPIRY, stats_callback=None,
+             parsers=PARSE_WORKERS, scheduler=None, source=None):
+        """Open an AoT object saved with save, memory mapping the sensor
+        arrays of every node.
+
+        :param path      : Directory the snapshot was written to
+        :type  path      : str
+        :param mmap_mode : Memory map mode for np.load (None to read in)
+        :type  mmap_mode : str
+        :return          : The AoT object
+        :rtype           : AoT
+        """
+        with open(os.path.join(path, 'aot.json')) as f:
+            meta = json.load(f)
+
+        aot = cls.__new__(cls)
+        aot._workers = workers
+        aot._parsers = parsers
+        aot._scheduler = scheduler
+        aot._cache = cache
+        aot._source = source
+        aot._lazy = False
+        aot._codes = None
+        aot._missing_expiry = missing_expiry
+        aot._stats_callback = stats_callback
+        aot._strt_dte = str(meta['strt_dte'])
+        aot._stp_dte = str(meta['stp_dte'])
+        aot._nodes = {}
+        for name in meta['nodes']:
+            name = str(name)
+            aot._nodes[name] = Node.load(os.path.join(path, name), mmap_mode,
+                                         workers, cache, missing_expiry,
+                                         stats_callback, source, parsers)
+        return aot
+
+    def summary(self):
+        """Running statistics of every sensor, merged across all the Nodes
+        in the AoT object. Only the per-sensor statistics are combined; no
+        data points are touched.
+
+        :return : Dictionary of {code: {type: RunningStats}}
+        :rtype  : dict
+        """
+        parts = {}
+        for node in self._nodes.itervalues():
+            for code, summary in node.summary().iteritems():
+                for dtype, stats in summary.iteritems():
+                    parts.setdefault(code, {}).setdefault(dtype, []).append(stats)
+
+        return {code: {dtype: merge_stats(stats)
+                       for dtype, stats in dtypes.iteritems()}
+                for code, dtypes in parts.iteritems()}
+
+    def report(self, path, figures=None, processes=PARSE_WORKERS,
+               force=False):
+        """Render the timeseries figure and IR grid view of every Node into
+        a directory, without a display, in a pool of processes. Figures
+        whose data has not changed since the last report are skipped.
+
+        :param path      : Directory the figures are written to
+        :type  path      : str
+        :param figures   : Figures to render (see report.FIGURES), all by
+                           default
+        :type  figures   : list
+        :param processes : Number of rendering processes, 0 to render in
+                           this process
+        :type  processes : int
+        :param force     : True to redraw every figure
+        :type  force     : bool
+        :return          : Dictionary of {file name: status} (see
+                           report.render)
+        :rtype           : OrderedDict
+        """
+        return render(self, path, figures, processes, force)
+
+    def matrix(self, window, how='mean', nodes=None, codes=None, dtypes=None,
+               origin=None):
+        """Readings of every Node on one common time grid, as a single
+        (time x channel) array with one column per (node, sensor, type)
+        channel and NaN (masked) where a channel has no reading. Built in
+        one vectorized pass over all the data (see matrix.align).
+
+        :param window : Width of the time buckets
+        :type  window : dt.timedelta
+        :param how    : Aggregation of the readings in a bucket: 'mean',
+                        'sum', 'min', 'max' or 'last'
+        :type  how    : str
+        :param nodes  : Names of the Nodes to include, None for all
+        :type  nodes  : list
+        :param codes  : Sensor codes to include, None for all
+        :type  codes  : list
+        :param dtypes : Types of data to include (e.g. 'Temperature'), None
+                        for all
+        :type  dtypes : list
+        :param origin : Start of the first bucket in seconds since the
+                        epoch, defaults to the first reading rounded down to
+                        a multiple of window
+        :type  origin : int
+        :return       : The aligned readings
+        :rtype        : Matrix
+        """
+        columns = []
+        for name in sorted(nodes or self._nodes):
+            node = self._nodes[name]
+            for code in sorted(codes or node.sensors):
+                sensor = node.sensor(code)
+                if sensor is not None:
+                    columns.extend(sensor_columns(name, sensor, dtypes))
+        return align(columns, window, how, origin)
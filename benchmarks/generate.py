@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Generate realistic hourly AoT data files laid out like DATA_URI:
+
+    <root>/waggle-data/<node>/data/data_<mm>-<dd>-<yyyy>-<hh>.txt
+
+Every sensor in SENSOR_CODES reports once per sampling step; readings
+drift as bounded random walks so smoothing and statistics see plausible
+data. Output is reproducible for a given seed.
+
+    python benchmarks/generate.py /tmp/aot --nodes ucaot01,ucaot02 \
+        --strt 03-20-2016 --days 2 --step 4
+"""
+import os
+import sys
+import random
+import argparse
+import datetime as dt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants import SENSOR_CODES, GRID_SENSOR, GRID_SHAPE
+from ingest import TIME_FORMAT
+
+
+# Full sensor names and (type, unit, start, low, high, step) of each reading
+SENSORS = {
+    'MLX90614ESF-DAA': ('MLX90614ESF-DAA.Melexis.2011',
+                        [('Temperature', 'C', 22.0, -20.0, 45.0, 0.05)]),
+    'TMP421': ('TMP421.Texas_Instruments.2012',
+               [('Temperature', 'C', 24.0, -20.0, 45.0, 0.05)]),
+    'BMP180': ('BMP180.Bosch.2_5-2013',
+               [('Temperature', 'C', 23.0, -20.0, 45.0, 0.05),
+                ('Pressure', 'PA', 99500.0, 97000.0, 103000.0, 5.0)]),
+    'PDV_P8104': ('PDV_P8104.API.2006',
+                  [('Luminous_Intensity', 'voltage_divider_5v_PDV_tap_4K7_GND',
+                    2.5, 0.0, 5.0, 0.02)]),
+    'Thermistor_NTC_PR103J2': ('Thermistor_NTC_PR103J2.RadioShack.2012',
+                               [('Temperature', 'C', 23.5, -20.0, 45.0, 0.05)]),
+    'HIH6130': ('HIH6130.Honeywell.2011',
+                [('Temperature', 'C', 23.0, -20.0, 45.0, 0.05),
+                 ('Humidity', '%RH', 45.0, 5.0, 95.0, 0.2)]),
+    'SHT15': ('SHT15.Sensirion.2011',
+              [('Temperature', 'C', 23.0, -20.0, 45.0, 0.05),
+               ('Humidity', '%RH', 45.0, 5.0, 95.0, 0.2)]),
+    'DS18B20': ('DS18B20.Maxim.2008',
+                [('Temperature', 'C', 22.5, -20.0, 45.0, 0.05)]),
+    'RHT03': ('RHT03.Maxdetect.2012',
+              [('Temperature', 'C', 23.0, -20.0, 45.0, 0.1),
+               ('Humidity', '%RH', 45.0, 5.0, 95.0, 0.3)]),
+    'SHT75': ('SHT75.Sensirion.2011',
+              [('Temperature', 'C', 23.0, -20.0, 45.0, 0.05),
+               ('Humidity', '%RH', 45.0, 5.0, 95.0, 0.2)]),
+    'HIH4030': ('HIH4030.Honeywell.2008',
+                [('Humidity', 'RH', 45.0, 5.0, 95.0, 0.3)]),
+    'GA1A1S201WP': ('GA1A1S201WP.Sharp.2007',
+                    [('Luminous_Intensity', 'Units10B0V5', 500.0, 0.0, 1023.0,
+                      4.0)]),
+    'MAX4466': ('MAX4466.Maxim.2012',
+                [('Acoustic_Intensity', 'Units10B0V5', 300.0, 0.0, 1023.0,
+                  20.0)]),
+    'HTU21D': ('HTU21D.MeasSpec.2013',
+               [('Temperature', 'C', 23.0, -20.0, 45.0, 0.05),
+                ('Humidity', '%RH', 45.0, 5.0, 95.0, 0.2)]),
+}
+
+GRID_CODE = GRID_SENSOR.split('.', 1)[0]
+
+# PTAT (ambient) and per-pixel readings of the IR grid
+GRID_START = 25.0
+GRID_LIMITS = (-20.0, 60.0)
+GRID_STEP = 0.1
+
+
+def data_path(root, node, hour):
+    """Path of an hourly data file, matching the layout of DATA_URI.
+
+    :param root : Root directory of the generated data
+    :type  root : str
+    :param node : Name of the AoT node
+    :type  node : str
+    :param hour : Start of the hour
+    :type  hour : dt.datetime
+    :return     : Path of the file
+    :rtype      : str
+    """
+    fname = 'data_{:02d}-{:02d}-{}-{:02d}.txt'
+    fname = fname.format(hour.month, hour.day, hour.year, hour.hour)
+    return os.path.join(root, 'waggle-data', node, 'data', fname)
+
+
+class Walk(object):
+    """Walk class for a reading drifting as a bounded random walk.
+
+    INSTANCE VARIABLES
+        value : float : Current reading
+    """
+    def __init__(self, rng, start, low, high, step):
+        self._rng = rng
+        self._low = low
+        self._high = high
+        self._step = step
+        self.value = start
+
+    def next(self):
+        value = self.value + self._rng.uniform(-self._step, self._step)
+        self.value = min(self._high, max(self._low, value))
+        return self.value
+
+
+class NodeGenerator(object):
+    """NodeGenerator class for the readings of one synthetic AoT node.
+
+    INSTANCE VARIABLES
+        node : str : Name of the AoT node
+        step : int : Seconds between readings of each sensor
+    """
+    def __init__(self, node, step=4, seed=0):
+        self._node = node
+        self._step = step
+        self._rng = random.Random('{}-{}'.format(seed, node))
+        self._walks = {}
+        for code in SENSOR_CODES:
+            if code in SENSORS:
+                self._walks[code] = [Walk(self._rng, *reading[2:])
+                                     for reading in SENSORS[code][1]]
+        low, high = GRID_LIMITS
+        npixels = GRID_SHAPE[0] * GRID_SHAPE[1]
+        self._grid = [Walk(self._rng, GRID_START, low, high, GRID_STEP)
+                      for i in range(npixels + 1)]
+
+    @property
+    def node(self):
+        return self._node
+
+    @property
+    def step(self):
+        return self._step
+
+    def lines(self, hour):
+        """Lines of the hourly data file starting at hour.
+
+        :param hour : Start of the hour
+        :type  hour : dt.datetime
+        :return     : Generator of the lines
+        :rtype      : generator
+        """
+        for second in xrange(0, 3600, self._step):
+            stamp = (hour + dt.timedelta(seconds=second)).strftime(TIME_FORMAT)
+            for code in SENSOR_CODES:
+                if code in self._walks:
+                    yield self._line(code, stamp)
+                elif code == GRID_CODE:
+                    yield self._grid_line(stamp)
+
+    def write(self, root, hour):
+        """Write the hourly data file starting at hour.
+
+        :param root : Root directory of the generated data
+        :type  root : str
+        :param hour : Start of the hour
+        :type  hour : dt.datetime
+        :return     : Number of lines written
+        :rtype      : int
+        """
+        fname = data_path(root, self._node, hour)
+        dirname = os.path.dirname(fname)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        n = 0
+        with open(fname, 'w') as f:
+            for line in self.lines(hour):
+                f.write(line)
+                n += 1
+        return n
+
+    def _line(self, code, stamp):
+        name, readings = SENSORS[code]
+        data = ['{};{:.2f};{};none'.format(reading[0], walk.next(), reading[1])
+                for reading, walk in zip(readings, self._walks[code])]
+        return '{},{},{}\n'.format(name, stamp, ','.join(data))
+
+    def _grid_line(self, stamp):
+        ptat = self._grid[0].next()
+        data = ['Temperature;{:.1f};C;PTAT'.format(ptat)]
+        for i, walk in enumerate(self._grid[1:]):
+            row, col = divmod(i, GRID_SHAPE[1])
+            data.append('Temperature;{:.1f};C;{} x {}'.format(walk.next(), row,
+                                                              col))
+        return '{},{},{}\n'.format(GRID_SENSOR, stamp, ','.join(data))
+
+
+def generate(root, nodes, strt, days=1, step=4, seed=0, missing=0.0):
+    """Write the hourly data files of several nodes over several days.
+
+    :param root    : Root directory of the generated data
+    :type  root    : str
+    :param nodes   : Names of the AoT nodes
+    :type  nodes   : list
+    :param strt    : First day, as 'mm-dd-yyyy'
+    :type  strt    : str
+    :param days    : Number of days
+    :type  days    : int
+    :param step    : Seconds between readings of each sensor
+    :type  step    : int
+    :param seed    : Seed of the random readings
+    :type  seed    : int
+    :param missing : Fraction of the hourly files left out, to emulate gaps
+                     upstream
+    :type  missing : float
+    :return        : Number of lines written
+    :rtype         : int
+    """
+    start = dt.datetime.strptime(strt, '%m-%d-%Y')
+    skip = random.Random(seed)
+    n = 0
+    for node in nodes:
+        generator = NodeGenerator(node, step, seed)
+        for i in xrange(days * 24):
+            hour = start + dt.timedelta(hours=i)
+            if skip.random() < missing:
+                continue
+            n += generator.write(root, hour)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('root', help='directory to write the data to')
+    parser.add_argument('--nodes', default='ucaot01',
+                        help='comma separated node names')
+    parser.add_argument('--strt', default='03-20-2016',
+                        help='first day (mm-dd-yyyy)')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--step', type=int, default=4,
+                        help='seconds between readings of each sensor')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing', type=float, default=0.0,
+                        help='fraction of hourly files to leave out')
+    args = parser.parse_args(argv)
+
+    n = generate(args.root, args.nodes.split(','), args.strt, args.days,
+                 args.step, args.seed, args.missing)
+    print 'Wrote {} lines to {}'.format(n, args.root)
+
+
+if __name__ == '__main__':
+    main()
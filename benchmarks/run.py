@@ -0,0 +1,421 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark suite for pulling, storing, smoothing and plotting AoT data.
+
+Synthetic hourly files (see generate.py) are served from a local stand-in
+of the data host (see server.py), so every run sees the same data and no
+network; the ingest_local and ingest_archive benchmarks read the same files
+straight from disk and from a compressed archive instead, and the refresh
+benchmark serves files of the current hour that grow between refreshes.
+Each benchmark is run --repeat times and the fastest run is reported;
+results can be saved with --save and compared against a saved run with
+--compare.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --nodes 4 --days 2 --save base.json
+    python benchmarks/run.py ingest smoothing --compare base.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import multiprocessing
+import datetime as dt
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from aot import AoT
+from cache import Cache
+from fetch import POOL, HTTPSource
+from source import DirectorySource, ArchiveSource, pack
+from constants import FETCH_WORKERS, PARSE_WORKERS
+from sensor import GridSensor
+from generate import generate, data_path, NodeGenerator
+from server import DataServer
+
+
+STRT = '03-20-2016'
+
+# Buckets the sensors are resampled to by the smoothing benchmark
+WINDOWS = [dt.timedelta(minutes=10), dt.timedelta(hours=1),
+           dt.timedelta(hours=2), dt.timedelta(hours=24)]
+
+
+class Context(object):
+    """Context class for what the benchmarks share: the generated data, the
+    server answering for it and a scratch directory.
+
+    INSTANCE VARIABLES
+        nodes   : list       : Names of the generated nodes
+        strt    : str        : First day of the data
+        stp     : str        : Last day of the data
+        workers : int        : Number of parallel downloads
+        parsers : int        : Number of parse processes
+        server  : DataServer : Stand-in of the data host
+        data    : str        : Directory holding the generated data
+        scratch : str        : Directory for caches and plots
+    """
+    def __init__(self, nodes, strt, stp, workers, parsers, server, data,
+                 scratch):
+        self.nodes = nodes
+        self.strt = strt
+        self.stp = stp
+        self.workers = workers
+        self.parsers = parsers
+        self.server = server
+        self.data = data
+        self.scratch = scratch
+        self._aot = None
+
+    def pull(self, dtypes=None, cache=None, source=None):
+        """Pull every node, from the server unless another source is given.
+
+        :param dtypes : Types of data to pull, None for all sensors
+        :type  dtypes : list
+        :param cache  : Optional on-disk cache
+        :type  cache  : Cache
+        :param source : Where to read the hourly files from
+        :type  source : Source
+        :return       : The AoT object
+        :rtype        : AoT
+        """
+        if source is None:
+            source = HTTPSource(self.server.uri)
+        return AoT(self.nodes, dtypes, self.strt, self.stp,
+                   workers=self.workers, cache=cache, parsers=self.parsers,
+                   source=source)
+
+    @property
+    def aot(self):
+        # Pulled once and shared by the benchmarks that only read data
+        if self._aot is None:
+            self._aot = self.pull()
+        return self._aot
+
+
+def _ingest_metrics(aot, seconds):
+    stats = aot.stats
+    metrics = OrderedDict()
+    metrics['seconds'] = seconds
+    metrics['lines'] = stats.lines
+    metrics['points'] = sum(stats.points.values())
+    metrics['lines/s'] = stats.lines / seconds
+    metrics['MB/s'] = stats.bytes / seconds / 1e6
+    for stage in ('fetch', 'tokenize', 'append'):
+        metrics[stage] = stats.stages[stage]
+    return metrics
+
+
+def bench_ingest(ctx):
+    """Pull every sensor of every node from the server."""
+    started = time.time()
+    aot = ctx.pull()
+    return _ingest_metrics(aot, time.time() - started)
+
+
+def bench_ingest_select(ctx):
+    """Pull only the Temperature readings of every node."""
+    started = time.time()
+    aot = ctx.pull(['Temperature'])
+    return _ingest_metrics(aot, time.time() - started)
+
+
+def bench_ingest_cached(ctx):
+    """Pull every node again from a warm on-disk cache."""
+    path = os.path.join(ctx.scratch, 'cache')
+    if not os.path.isdir(path):
+        ctx.pull(cache=Cache(path))
+    started = time.time()
+    aot = ctx.pull(cache=Cache(path))
+    return _ingest_metrics(aot, time.time() - started)
+
+
+def bench_ingest_local(ctx):
+    """Pull every node from the data directory, without the server."""
+    started = time.time()
+    aot = ctx.pull(source=DirectorySource(ctx.data))
+    return _ingest_metrics(aot, time.time() - started)
+
+
+def bench_ingest_archive(ctx):
+    """Pull every node from a gzip compressed tar archive of the data."""
+    path = os.path.join(ctx.scratch, 'data.tar.gz')
+    if not os.path.isfile(path):
+        pack(ctx.data, path)
+    started = time.time()
+    with ArchiveSource(path) as source:
+        aot = ctx.pull(source=source)
+    return _ingest_metrics(aot, time.time() - started)
+
+
+def _refresh(aot, server, stp):
+    # Refresh every node, returning the seconds taken, the responses of the
+    # server by status, the body bytes it sent and the points added
+    requests, sent = server.statuses, server.sent
+    points = sum(aot.stats.points.values())
+    started = time.time()
+    aot.refresh(stp)
+    seconds = time.time() - started
+    statuses = {status: n - requests.get(status, 0)
+                for status, n in server.statuses.iteritems()
+                if n != requests.get(status, 0)}
+    return (seconds, statuses, server.sent - sent,
+            sum(aot.stats.points.values()) - points)
+
+
+def bench_refresh(ctx):
+    """Pull the current hour of every node while its file is half written,
+    then refresh once it has grown and once more after it has not. The
+    first refresh must fetch only the appended bytes (one Range request
+    per node) and the second nothing (one conditional request per node)."""
+    path = os.path.join(ctx.scratch, 'live')
+    shutil.rmtree(path, ignore_errors=True)
+    hour = dt.datetime.now().replace(minute=0, second=0, microsecond=0)
+    today = hour.strftime('%m-%d-%Y')
+    rests = []
+    for name in ctx.nodes:
+        lines = list(NodeGenerator(name).lines(hour))
+        half = len(lines) // 2
+        fname = data_path(path, name, hour)
+        os.makedirs(os.path.dirname(fname))
+        with open(fname, 'w') as f:
+            f.writelines(lines[:half])
+        rests.append((fname, lines[half:]))
+
+    with DataServer(path) as server:
+        aot = AoT(ctx.nodes, None, today, today, workers=ctx.workers,
+                  parsers=ctx.parsers, source=HTTPSource(server.uri))
+        for fname, rest in rests:
+            with open(fname, 'a') as f:
+                f.writelines(rest)
+
+        seconds, grown, sent, points = _refresh(aot, server, today)
+        appended = sum(len(line) for fname, rest in rests for line in rest)
+        lines = sum(len(rest) for fname, rest in rests)
+        if grown != {206: len(ctx.nodes)} or sent != appended:
+            raise RuntimeError('refresh of grown files: responses {}, {} '
+                               'bytes sent for {} appended'.format(
+                                   grown, sent, appended))
+        if points != lines:
+            raise RuntimeError('refresh of grown files added {} points for '
+                               '{} lines'.format(points, lines))
+
+        unchanged = _refresh(aot, server, today)
+        if unchanged[1] != {304: len(ctx.nodes)} or unchanged[2:] != (0, 0):
+            raise RuntimeError('refresh of unchanged files: responses {}, {} '
+                               'bytes sent, {} points added'.format(
+                                   *unchanged[1:]))
+
+    metrics = OrderedDict()
+    metrics['seconds'] = seconds
+    metrics['bytes'] = sent
+    metrics['points'] = points
+    metrics['unchanged'] = unchanged[0]
+    return metrics
+
+
+def _memory(ctx, conn):
+    # Run in a child process so the peak resident size is the pull's own
+    before = _max_rss()
+    started = time.time()
+    aot = ctx.pull()
+    seconds = time.time() - started
+    points = sum(aot.stats.points.values())
+    conn.send((seconds, points, _max_rss() - before))
+    conn.close()
+
+
+def _max_rss():
+    # Peak resident set size in bytes (kilobytes on Linux, bytes on OS X)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def bench_memory(ctx):
+    """Peak memory taken by pulling every node, per million points."""
+    parent, child = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_memory, args=(ctx, child))
+    process.start()
+    seconds, points, nbytes = parent.recv()
+    process.join()
+
+    metrics = OrderedDict()
+    metrics['seconds'] = seconds
+    metrics['points'] = points
+    metrics['MB'] = nbytes / 1e6
+    metrics['MB/Mpoint'] = nbytes / float(points) if points else None
+    return metrics
+
+
+def bench_smoothing(ctx):
+    """Resample every sensor to several windows and smooth the IR grid."""
+    nodes = [n.between() for n in ctx.aot.nodes.itervalues()]
+    started = time.time()
+    buckets = 0
+    for n in nodes:
+        for sensor in n.sensors.itervalues():
+            for aggs in sensor.resample_many(WINDOWS):
+                buckets += len(aggs)
+            if isinstance(sensor, GridSensor):
+                sensor.smooth(1)
+                sensor.smooth(2)
+
+    metrics = OrderedDict()
+    metrics['seconds'] = time.time() - started
+    metrics['buckets'] = buckets
+    return metrics
+
+
+def bench_render(ctx):
+    """Draw the Node timeseries figure, the IR grid heatmap PDF and the IR
+    grid overview of the first node."""
+    n = ctx.aot.nodes[ctx.nodes[0]]
+    grid = n.sensor('D6T-44L-06')
+    cwd = os.getcwd()
+    os.chdir(ctx.scratch)
+    try:
+        metrics = OrderedDict()
+        for name, draw in (('node_timeseries', n.plot_timeseries),
+                           ('grid_heatmap', lambda: grid.plot_heatmap(1)),
+                           ('grid_view', grid.view_grid)):
+            started = time.time()
+            draw()
+            plt.close('all')
+            metrics[name] = time.time() - started
+    finally:
+        os.chdir(cwd)
+    return OrderedDict([('seconds', sum(metrics.values()))] +
+                       metrics.items())
+
+
+BENCHMARKS = OrderedDict([('ingest', bench_ingest),
+                          ('ingest_select', bench_ingest_select),
+                          ('ingest_cached', bench_ingest_cached),
+                          ('ingest_local', bench_ingest_local),
+                          ('ingest_archive', bench_ingest_archive),
+                          ('refresh', bench_refresh),
+                          ('memory', bench_memory),
+                          ('smoothing', bench_smoothing),
+                          ('render', bench_render)])
+
+
+def run(ctx, names, repeat=3):
+    """Run benchmarks, keeping the fastest of several runs of each.
+
+    :param ctx    : Shared data, server and scratch directory
+    :type  ctx    : Context
+    :param names  : Names of the benchmarks to run (see BENCHMARKS)
+    :type  names  : list
+    :param repeat : Number of runs of each benchmark
+    :type  repeat : int
+    :return       : Dictionary of {name: metrics}
+    :rtype        : OrderedDict
+    """
+    results = OrderedDict()
+    for name in names:
+        best = None
+        for i in range(repeat):
+            metrics = BENCHMARKS[name](ctx)
+            if best is None or metrics['seconds'] < best['seconds']:
+                best = metrics
+        results[name] = best
+    return results
+
+
+def report(results, baseline=None):
+    """Print the results, with the change in time against a baseline.
+
+    :param results  : Dictionary of {name: metrics} (see run)
+    :type  results  : dict
+    :param baseline : Results of an earlier run
+    :type  baseline : dict
+    :return         : None
+    :rtype          : None
+    """
+    for name, metrics in results.iteritems():
+        line = '{:<14} {:>9.3f}s'.format(name, metrics['seconds'])
+        if baseline and name in baseline:
+            before = baseline[name]['seconds']
+            line += ' {:>+7.1%}'.format(metrics['seconds'] / before - 1)
+        print line
+        for key, value in metrics.iteritems():
+            if key == 'seconds':
+                continue
+            if isinstance(value, float):
+                value = '{:.4g}'.format(value)
+            print '    {:<16} {}'.format(key, value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('benchmarks', nargs='*',
+                        help='benchmarks to run, all by default: ' +
+                        ', '.join(BENCHMARKS))
+    parser.add_argument('--nodes', type=int, default=2,
+                        help='number of nodes to generate')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--step', type=int, default=8,
+                        help='seconds between readings of each sensor')
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS,
+                        help='number of parallel downloads')
+    parser.add_argument('--parsers', type=int, default=PARSE_WORKERS,
+                        help='number of parse processes')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each request is delayed by')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data', help='directory to keep the generated '
+                        'data in between runs (a temporary one by default)')
+    parser.add_argument('--save', help='write the results to a JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    args = parser.parse_args(argv)
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark: ' + name)
+
+    scratch = tempfile.mkdtemp(prefix='aot-bench-')
+    data = args.data or os.path.join(scratch, 'data')
+    names = ['ucaot{:02d}'.format(i + 1) for i in range(args.nodes)]
+    stp = dt.datetime.strptime(STRT, '%m-%d-%Y')
+    stp = (stp + dt.timedelta(days=args.days - 1)).strftime('%m-%d-%Y')
+    try:
+        if not os.path.isdir(os.path.join(data, 'waggle-data')):
+            print 'Generating data...'
+            generate(data, names, STRT, args.days, args.step)
+
+        with DataServer(data, latency=args.latency) as server:
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, 'w')
+            try:
+                ctx = Context(names, STRT, stp, args.workers, args.parsers,
+                              server, data, scratch)
+                results = run(ctx, args.benchmarks or BENCHMARKS.keys(),
+                              args.repeat)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+                # Hang up the kept-alive connections to the server
+                POOL.close()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
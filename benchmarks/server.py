@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Serve generated hourly AoT data files (see generate.py) over HTTP the way
+the upstream host does, so pulls can be benchmarked offline.
+
+    python benchmarks/server.py /tmp/aot --port 8000
+
+then pull through HTTPSource(uri) with uri
+http://127.0.0.1:8000/waggle-data/{}/data/data_{}-{}-{}-{}.txt
+"""
+import os
+import time
+import argparse
+import threading
+import email.utils
+import BaseHTTPServer
+import SocketServer
+
+
+URI = 'http://{}:{}/waggle-data/{{}}/data/data_{{}}-{{}}-{{}}-{{}}.txt'
+
+
+class DataHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """DataHandler class for answering GET requests for the files under the
+    root directory of a DataServer. Connections are kept alive, and Range
+    and If-None-Match requests are answered like a typical static file
+    server.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+
+        path = os.path.join(server.root, self.path.split('?')[0].lstrip('/'))
+        if not os.path.isfile(path):
+            self._respond(404)
+            return
+
+        st = os.stat(path)
+        etag = '"{:x}-{:x}"'.format(st.st_size, int(st.st_mtime * 1e6))
+        modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        headers = [('ETag', etag), ('Last-Modified', modified)]
+        if self.headers.get('If-None-Match') == etag:
+            self._respond(304, headers)
+            return
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        status = 200
+        rng = self.headers.get('Range')
+        if rng and rng.startswith('bytes=') and rng.endswith('-'):
+            start = int(rng[len('bytes='):-1])
+            if start >= len(data):
+                rng = 'bytes */{}'.format(len(data))
+                self._respond(416, [('Content-Range', rng)])
+                return
+            status = 206
+            rng = 'bytes {}-{}/{}'.format(start, len(data) - 1, len(data))
+            headers.append(('Content-Range', rng))
+            data = data[start:]
+        self._respond(status, headers, data)
+
+    def _respond(self, status, headers=(), body=''):
+        self.server.count(status, len(body))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DataServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """DataServer class for a local stand-in of the AoT data host, run on a
+    background thread.
+
+    INSTANCE VARIABLES
+        root     : str   : Directory holding the waggle-data tree
+        latency  : float : Seconds each request is delayed by, to emulate a
+                           remote host
+        uri      : str   : Template of the hourly file URLs, for HTTPSource
+        requests : int   : Number of requests answered
+        statuses : dict  : Number of responses of each status code
+        sent     : int   : Number of body bytes sent
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root, host='127.0.0.1', port=0, latency=0.0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), DataHandler)
+        self._root = root
+        self._latency = latency
+        self._requests = 0
+        self._statuses = {}
+        self._sent = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def latency(self):
+        return self._latency
+
+    @property
+    def uri(self):
+        host, port = self.server_address[:2]
+        return URI.format(host, port)
+
+    @property
+    def requests(self):
+        return self._requests
+
+    @property
+    def statuses(self):
+        with self._lock:
+            return dict(self._statuses)
+
+    @property
+    def sent(self):
+        return self._sent
+
+    def count(self, status, nbytes):
+        with self._lock:
+            self._requests += 1
+            self._statuses[status] = self._statuses.get(status, 0) + 1
+            self._sent += nbytes
+
+    def start(self):
+        """Serve requests on a background thread.
+
+        :return : None
+        :rtype  : None
+        """
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the listening socket.
+
+        :return : None
+        :rtype  : None
+        """
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('root', help='directory holding the generated data')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each request is delayed by')
+    args = parser.parse_args(argv)
+
+    server = DataServer(args.root, args.host, args.port, args.latency)
+    print 'Serving {} as {}'.format(args.root, server.uri)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
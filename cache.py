@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import time
+import errno
+import tempfile
+import threading
+import datetime as dt
+from constants import CACHE_DIR, CACHE_MAX_BYTES, MISSING_EXPIRY
+
+
+class Cache(object):
+    """Cache class for keeping raw hourly AoT data files on local disk.
+
+    Files are keyed by (node, hour) where hour is the datetime of the start
+    of the hourly file. The least recently used files are evicted once the
+    total size of the cache exceeds max_bytes. Files are written atomically
+    so several processes can share one cache directory.
+
+    Hours that are over but have no file upstream are remembered with an
+    empty marker file, so later pulls do not ask for them again until the
+    marker is missing_expiry seconds old.
+
+    INSTANCE VARIABLES
+        path           : str : Root directory of the cache
+        max_bytes      : int : Size limit of the cache in bytes
+        missing_expiry : int : Seconds a file stays known to be missing
+    """
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_MAX_BYTES,
+                 missing_expiry=MISSING_EXPIRY):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._missing_expiry = missing_expiry
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def missing_expiry(self):
+        return self._missing_expiry
+
+    @property
+    def size(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(f) for f in self._files())
+            return self._size
+
+    def filename(self, key):
+        """Path of the cached file for a (node, hour) key.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :return    : Path of the file in the cache
+        :rtype     : str
+        """
+        node, hour = key
+        fname = '{:04d}-{:02d}-{:02d}-{:02d}.txt'
+        fname = fname.format(hour.year, hour.month, hour.day, hour.hour)
+        return os.path.join(self._path, node, fname)
+
+    def cacheable(self, key, now=None):
+        """Determines whether the hourly file for a key is complete. The
+           current hour is still being written upstream and is never cached.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :param now : Current time, defaults to dt.datetime.now()
+        :type  now : dt.datetime
+        :return    : True if the file can be cached
+        :rtype     : bool
+        """
+        if now is None:
+            now = dt.datetime.now()
+        return key[1] + dt.timedelta(hours=1) <= now
+
+    def is_missing(self, key):
+        """Determines whether a file is known to be missing upstream.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :return    : True if the file was found missing less than
+                     missing_expiry seconds ago
+        :rtype     : bool
+        """
+        try:
+            mtime = os.path.getmtime(self._marker(key))
+        except OSError:
+            return False
+        return time.time() - mtime < self._missing_expiry
+
+    def mark_missing(self, key):
+        """Remember that a file is missing upstream. Only hours that are
+           over are remembered.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :return    : None
+        :rtype     : None
+        """
+        if not self.cacheable(key):
+            return
+
+        fname = self._marker(key)
+        try:
+            os.makedirs(os.path.dirname(fname))
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+        open(fname, 'w').close()
+
+    def open(self, key):
+        """Open a file in the cache for reading and mark it as recently used.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :return    : File object, or None if the file is not cached
+        :rtype     : file
+        """
+        fname = self.filename(key)
+        try:
+            handle = open(fname, 'rb')
+            os.utime(fname, None)
+        except (IOError, OSError):
+            return None
+        return handle
+
+    def writer(self, key):
+        """Start writing a file to the cache. Nothing becomes visible in the
+           cache until the writer is committed.
+
+        :param key : (node, hour) tuple
+        :type  key : tuple
+        :return    : CacheWriter for the file, or None if the file is not
+                     cacheable
+        :rtype     : CacheWriter
+        """
+        if not self.cacheable(key):
+            return None
+        return CacheWriter(self, self.filename(key))
+
+    def added(self, nbytes):
+        """Account for a file added to the cache, evicting the least recently
+           used files if the cache grows past max_bytes.
+
+        :param nbytes : Size of the added file
+        :type  nbytes : int
+        :return       : None
+        :rtype        : None
+        """
+        with self._lock:
+            if self._size is not None:
+                self._size += nbytes
+            over = self._size is None or self._size > self._max_bytes
+        if over:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used files until the cache fits in
+           max_bytes.
+
+        :return : None
+        :rtype  : None
+        """
+        with self._lock:
+            entries = []
+            for fname in self._files():
+                try:
+                    st = os.stat(fname)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, fname))
+
+            size = sum(e[1] for e in entries)
+            for mtime, nbytes, fname in sorted(entries):
+                if size <= self._max_bytes:
+                    break
+                try:
+                    os.remove(fname)
+                except OSError:
+                    pass
+                size -= nbytes
+            self._size = size
+
+    def _marker(self, key):
+        return os.path.splitext(self.filename(key))[0] + '.missing'
+
+    def _files(self):
+        for dirpath, dirnames, filenames in os.walk(self._path):
+            for fname in filenames:
+                if not fname.startswith('.tmp-'):
+                    yield os.path.join(dirpath, fname)
+
+
+class CacheWriter(object):
+    """CacheWriter class for atomically writing one file to a Cache.
+
+    Data is written to a temporary file in the destination directory which
+    is renamed into place on commit, so readers never see partial files.
+
+    INSTANCE VARIABLES
+        filename : str : Final path of the file in the cache
+    """
+    def __init__(self, cache, filename):
+        self._cache = cache
+        self._filename = filename
+        self._nbytes = 0
+
+        dirname = os.path.dirname(filename)
+        try:
+            os.makedirs(dirname)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+
+        fd, self._tmp = tempfile.mkstemp(dir=dirname, prefix='.tmp-')
+        os.chmod(self._tmp, 0644)
+        self._file = os.fdopen(fd, 'wb')
+
+    @property
+    def filename(self):
+        return self._filename
+
+    def write(self, data):
+        """Append data to the file.
+
+        :param data : Data to be written
+        :type  data : str
+        :return     : None
+        :rtype      : None
+        """
+        self._file.write(data)
+        self._nbytes += len(data)
+
+    def commit(self):
+        """Move the finished file into the cache.
+
+        :return : None
+        :rtype  : None
+        """
+        self._file.close()
+        os.rename(self._tmp, self._filename)
+        self._cache.added(self._nbytes)
+
+    def abort(self):
+        """Discard the file.
+
+        :return : None
+        :rtype  : None
+        """
+        self._file.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import multiprocessing
 
 
 BASEDIR = os.path.abspath(os.path.dirname(__file__))
@@ -13,4 +14,34 @@ SENSOR_CODES = [
 
 GRID_SENSOR = 'D6T-44L-06.Omron.2012'
 
-DATA_URI = "http://outworld.mcs.anl.gov/waggle-data/{}/data/data_{}-{}-{}-{}.txt"
\ No newline at end of file
+GRID_SHAPE = (4, 4)
+
+DATA_LAYOUT = "waggle-data/{}/data/data_{}-{}-{}-{}.txt"
+
+DATA_URI = "http://outworld.mcs.anl.gov/" + DATA_LAYOUT
+
+FETCH_WORKERS = 8
+
+CHUNK_SIZE = 64 * 1024
+
+STREAM_DEPTH = 16
+
+FETCH_TIMEOUT = 60
+
+FETCH_RETRIES = 5
+
+RETRY_BACKOFF = 0.5
+
+RETRY_BACKOFF_MAX = 30
+
+CACHE_DIR = os.path.join(BASEDIR, 'cache')
+
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+MISSING_EXPIRY = 24 * 3600
+
+ARCHIVE_BUFFER = 64 * 1024 ** 2
+
+PARSE_WORKERS = multiprocessing.cpu_count()
+
+DOWNSAMPLE_THRESHOLD = 10000
@@ -0,0 +1,756 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import re
+import time
+import Queue
+import random
+import httplib
+import urlparse
+import threading
+import urllib2
+from multiprocessing.pool import ThreadPool
+from constants import FETCH_WORKERS, CHUNK_SIZE, STREAM_DEPTH, FETCH_TIMEOUT
+from constants import FETCH_RETRIES, RETRY_BACKOFF, RETRY_BACKOFF_MAX
+from constants import DATA_URI
+from ingest import iter_lines
+from instrument import FetchStats, timed
+from source import Source, read_chunks
+
+
+# Statuses worth asking again for; any other error means the file is missing
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+MAX_REDIRECTS = 5
+
+# Markers passed from the download threads to the consumer
+_FOUND = object()
+_MISSING = object()
+_EOF = object()
+
+
+class FetchError(IOError):
+    """Raised when a file could not be downloaded, even after retrying."""
+
+
+def _raise(err):
+    # Generator that fails as soon as it is read
+    raise err
+    yield
+
+
+class ConnectionPool(object):
+    """ConnectionPool class for keeping HTTP connections to the data hosts
+    open between requests (keep-alive), so hourly files are downloaded over
+    a few persistent connections instead of one new connection each.
+
+    INSTANCE VARIABLES
+        max_idle : int : Number of idle connections kept per host
+        opened   : int : Number of connections opened so far
+    """
+    def __init__(self, max_idle=FETCH_WORKERS):
+        self._max_idle = max_idle
+        self._idle = {}
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_idle(self):
+        return self._max_idle
+
+    @property
+    def opened(self):
+        return self._opened
+
+    def acquire(self, scheme, host, timeout=FETCH_TIMEOUT):
+        """Take an idle connection to a host, or open a new one.
+
+        :param scheme  : 'http' or 'https'
+        :type  scheme  : str
+        :param host    : Host (and port) to connect to
+        :type  host    : str
+        :param timeout : Socket timeout in seconds
+        :type  timeout : float
+        :return        : (connection, reused) tuple; reused connections may
+                         have been closed by the server in the meantime
+        :rtype         : tuple
+        """
+        with self._lock:
+            idle = self._idle.get((scheme, host))
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self._opened += 1
+
+        if scheme == 'https':
+            return httplib.HTTPSConnection(host, timeout=timeout), False
+        return httplib.HTTPConnection(host, timeout=timeout), False
+
+    def release(self, scheme, host, conn, reusable=True):
+        """Give a connection back once its response has been read.
+
+        :param scheme   : 'http' or 'https'
+        :type  scheme   : str
+        :param host     : Host (and port) of the connection
+        :type  host     : str
+        :param conn     : The connection
+        :type  conn     : httplib.HTTPConnection
+        :param reusable : False if the connection must be closed
+        :type  reusable : bool
+        :return         : None
+        :rtype          : None
+        """
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault((scheme, host), [])
+                if len(idle) < self._max_idle:
+                    idle.append(conn)
+                    return
+        conn.close()
+
+    def close(self):
+        """Close every idle connection.
+
+        :return : None
+        :rtype  : None
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.itervalues():
+            for conn in conns:
+                conn.close()
+
+
+# Shared by every Fetcher unless one is given its own
+POOL = ConnectionPool()
+
+
+class Response(object):
+    """Response class for the body of a successful request, read in
+    chunks. Pooled connections go back to their pool when the response is
+    closed after being read to the end.
+
+    INSTANCE VARIABLES
+        status : int : HTTP status code
+        start  : int : Offset in the file of the first byte of the body
+    """
+    def __init__(self, status, handle, headers, release=None):
+        self._status = status
+        self._handle = handle
+        self._headers = headers
+        self._release = release
+        self._done = False
+
+        self._start = 0
+        if status == 206:
+            match = re.match(r'bytes\s+(\d+)-',
+                             headers.getheader('Content-Range', ''))
+            if match is None:
+                raise IOError("Unexpected Content-Range")
+            self._start = int(match.group(1))
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def start(self):
+        return self._start
+
+    def getheader(self, name, default=None):
+        """Value of a response header.
+
+        :param name    : Name of the header
+        :type  name    : str
+        :param default : Value returned if the header is absent
+        :type  default : str
+        :return        : Value of the header
+        :rtype         : str
+        """
+        return self._headers.getheader(name, default)
+
+    def read(self, size):
+        """Read the next chunk of the body.
+
+        :param size : Maximum number of bytes to read
+        :type  size : int
+        :return     : Chunk of the body, empty at the end
+        :rtype      : str
+        """
+        try:
+            chunk = self._handle.read(size)
+        except httplib.HTTPException as err:
+            raise IOError(str(err) or type(err).__name__)
+        if not chunk:
+            # httplib ends a body cut short without complaint
+            if getattr(self._handle, 'length', None):
+                raise IOError("Connection closed before the end of the body")
+            self._done = True
+        return chunk
+
+    def close(self):
+        """Finish with the response.
+
+        :return : None
+        :rtype  : None
+        """
+        if self._release is None:
+            self._handle.close()
+            return
+        release, self._release = self._release, None
+        release(self._done)
+
+
+class Download(object):
+    """Download class for streaming one hourly data file from a worker
+    thread to the consumer through a bounded queue of chunks.
+
+    INSTANCE VARIABLES
+        url       : str   : URL of the hourly data file
+        key       : tuple      : (node, hour) cache key of the file
+        stats     : FetchStats : Measurements of the download
+        cancelled : bool       : True once the consumer has stopped reading
+    """
+    def __init__(self, url, key=None, depth=STREAM_DEPTH, stats=None):
+        self._url = url
+        self._key = key
+        self._stats = stats
+        self._queue = Queue.Queue(depth)
+        self._cancelled = threading.Event()
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the download; the worker thread gives up at its next chunk.
+
+        :return : None
+        :rtype  : None
+        """
+        self._cancelled.set()
+
+    def put(self, item):
+        """Hand a chunk (or marker) to the consumer, blocking while the
+           queue is full.
+
+        :param item : Chunk of the file or marker
+        :type  item : str
+        :return     : False if the download was cancelled
+        :rtype      : bool
+        """
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def chunks(self):
+        """Wait for the download to start.
+
+        :return : Generator of the chunks of the file, or None if the file
+                  is missing; if the download failed, reading the generator
+                  raises the error
+        :rtype  : generator
+        """
+        item = self._queue.get()
+        if item is _MISSING:
+            return None
+        if isinstance(item, Exception):
+            return _raise(item)
+        return self._drain()
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is _EOF:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class Revision(object):
+    """Revision class for the part of an hourly data file that has already
+    been read, so later requests only transfer what has been appended.
+
+    INSTANCE VARIABLES
+        offset   : int : Number of bytes of the file already read
+        etag     : str : ETag of the file when it was last requested
+        modified : str : Last-Modified date of the file when it was last
+                         requested
+    """
+    def __init__(self, offset=0, etag=None, modified=None):
+        self.offset = offset
+        self.etag = etag
+        self.modified = modified
+
+    def __repr__(self):
+        tmpl = 'Revision(offset={}, etag={!r}, modified={!r})'
+        return tmpl.format(self.offset, self.etag, self.modified)
+
+
+class HTTPSource(Source):
+    """HTTPSource class for hourly files served over HTTP by the data host
+    (DATA_URI). Other URL schemes (e.g. file://) are read through urllib2.
+
+    Requests go over persistent connections from a ConnectionPool.
+    Connection errors, timeouts and transient statuses (RETRY_STATUS) are
+    retried with exponential backoff and jitter, and a transfer that breaks
+    off is resumed with a Range request, so only a file the server reports
+    as missing (e.g. 404) is treated as missing. FetchError is raised once
+    the retries are used up.
+
+    INSTANCE VARIABLES
+        uri     : str            : Template of the URLs of the hourly files
+        timeout : float          : Socket timeout in seconds
+        retries : int            : Number of times a request is retried
+        backoff : float          : Delay before the first retry in seconds,
+                                   doubled for each retry
+        pool    : ConnectionPool : Persistent HTTP connections
+    """
+    remote = True
+
+    def __init__(self, uri=DATA_URI, chunk_size=CHUNK_SIZE,
+                 timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES,
+                 backoff=RETRY_BACKOFF, pool=None):
+        Source.__init__(self, uri, chunk_size)
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._pool = POOL if pool is None else pool
+
+    def __repr__(self):
+        return 'HTTPSource({!r})'.format(self._layout)
+
+    @property
+    def uri(self):
+        return self._layout
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @property
+    def retries(self):
+        return self._retries
+
+    @property
+    def backoff(self):
+        return self._backoff
+
+    @property
+    def pool(self):
+        return self._pool
+
+    def open(self, url, stats):
+        response = self._request(url, None, stats)
+        if response is None:
+            return None
+        return self._read(url, response, 0, stats)
+
+    def open_new(self, url, revision, stats):
+        """Download whatever has been appended to an hourly data file since
+           it was last read. The request asks for the bytes past
+           revision.offset (HTTP Range) and is conditional on the ETag and
+           Last-Modified date seen last time, so an unchanged file costs a
+           single round trip without a body. Servers that ignore the Range
+           header are handled by skipping the bytes already read.
+
+        :param url      : URL of the hourly data file
+        :type  url      : str
+        :param revision : Part of the file already read; its etag and
+                          modified date are updated from the response
+        :type  revision : Revision
+        :param stats    : Filled in with the latency and the bytes read
+        :type  stats    : FetchStats
+        :return         : Generator of the chunks of the file after offset
+                          (empty if nothing changed), or None if the file is
+                          missing
+        :rtype          : generator
+        """
+        headers = {}
+        if revision.offset:
+            headers['Range'] = 'bytes={}-'.format(revision.offset)
+        if revision.etag is not None:
+            headers['If-None-Match'] = revision.etag
+        if revision.modified is not None:
+            headers['If-Modified-Since'] = revision.modified
+
+        response = self._request(url, headers, stats)
+        if response is None:
+            return None
+        # 304: not modified, 416: nothing past offset
+        if response.status in (304, 416):
+            response.close()
+            stats.elapsed = stats.latency
+            return iter([])
+
+        revision.etag = response.getheader('ETag', revision.etag)
+        revision.modified = response.getheader('Last-Modified',
+                                               revision.modified)
+        return self._read(url, response, revision.offset, stats)
+
+    def _request(self, url, headers, stats):
+        # _get, recording the outcome and latency in stats
+        try:
+            response = self._get(url, headers)
+        except FetchError:
+            stats.source = 'failed'
+            raise
+        stats.latency = time.time() - stats.started
+        stats.source = 'missing' if response is None else 'network'
+        return response
+
+    def _get(self, url, headers=None, redirects=MAX_REDIRECTS):
+        # GET url, retrying transient failures. Returns a Response, or None
+        # if the server says the file does not exist
+        parts = urlparse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            return self._get_other(url, headers)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        attempt = 0
+        while True:
+            conn, reused = self._pool.acquire(parts.scheme, parts.netloc,
+                                              self._timeout)
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+            except (IOError, httplib.HTTPException) as err:
+                conn.close()
+                if reused:
+                    # Closed by the server while idle; not a real failure
+                    continue
+                error = str(err) or type(err).__name__
+            else:
+                release = self._releaser(parts, conn, response)
+                location = response.getheader('Location')
+                if response.status in REDIRECT_STATUS and location:
+                    response.read()
+                    release(True)
+                    if not redirects:
+                        raise FetchError(url + ' (too many redirects)')
+                    location = urlparse.urljoin(url, location)
+                    return self._get(location, headers, redirects - 1)
+                if response.status < 400:
+                    return Response(response.status, response, response.msg,
+                                    release)
+
+                response.read()
+                release(True)
+                if response.status not in RETRY_STATUS:
+                    return None
+                error = 'HTTP {}'.format(response.status)
+
+            attempt += 1
+            if attempt > self._retries:
+                raise FetchError('{} ({})'.format(url, error))
+            time.sleep(self._delay(attempt))
+
+    def _get_other(self, url, headers=None):
+        # Schemes other than HTTP(S) (e.g. file://) go through urllib2
+        try:
+            request = urllib2.Request(url, headers=headers or {})
+            handle = urllib2.urlopen(request)
+        except (urllib2.URLError, IOError):
+            return None
+        return Response(200, handle, handle.info())
+
+    def _releaser(self, parts, conn, response):
+        def release(done):
+            reusable = done and not response.will_close
+            self._pool.release(parts.scheme, parts.netloc, conn, reusable)
+        return release
+
+    def _delay(self, attempt):
+        # Exponential backoff with jitter, so workers that failed together
+        # do not all retry at the same moment
+        delay = min(RETRY_BACKOFF_MAX, self._backoff * 2.0 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _read(self, url, response, offset=0, stats=None):
+        # Stream the body of a response from byte offset of the file on.
+        # If the transfer breaks off, the rest is requested with a Range
+        # request; bytes before offset, or already passed on before the
+        # break, are skipped when the server sends them anyway
+        position = response.start
+        delivered = max(offset, position)
+        failures = 0
+        try:
+            while True:
+                try:
+                    chunk = response.read(self._chunk_size)
+                except IOError as err:
+                    response.close()
+                    response = None
+                    failures += 1
+                    if failures > self._retries:
+                        if stats is not None:
+                            stats.source = 'failed'
+                        raise FetchError('{} ({})'.format(url, err))
+                    time.sleep(self._delay(failures))
+                    rest = 'bytes={}-'.format(delivered)
+                    response = self._get(url, {'Range': rest})
+                    if response is None:
+                        raise FetchError(url + ' (no longer available)')
+                    if response.status == 416:
+                        break
+                    position = response.start
+                    continue
+
+                if not chunk:
+                    break
+                if position < delivered:
+                    n = min(delivered - position, len(chunk))
+                    chunk = chunk[n:]
+                    position += n
+                    if not chunk:
+                        continue
+                position += len(chunk)
+                delivered = position
+                if stats is not None:
+                    stats.bytes += len(chunk)
+                yield chunk
+
+            if stats is not None:
+                stats.elapsed = time.time() - stats.started
+        finally:
+            if response is not None:
+                response.close()
+
+
+class Fetcher(object):
+    """Fetcher class for downloading hourly AoT data files concurrently.
+
+    Each file is read in chunks on a worker thread and streamed to the
+    consumer, so parsing overlaps with the network and at most
+    workers * depth chunks are held in memory at once.
+
+    Files are read through a Source: the data host over HTTP (HTTPSource,
+    the default), a local directory tree (DirectorySource) or an archive
+    (ArchiveSource). Only files from remote Sources go through the cache.
+
+    INSTANCE VARIABLES
+        workers    : int    : Maximum number of parallel downloads
+        cache      : Cache  : Optional on-disk cache read before a remote
+                              Source
+        chunk_size : int    : Number of bytes read from the cache at a time
+        depth      : int    : Number of chunks buffered per download
+        source     : Source : Where the hourly files are read from
+    """
+    def __init__(self, workers=FETCH_WORKERS, cache=None,
+                 chunk_size=CHUNK_SIZE, depth=STREAM_DEPTH, source=None):
+        self._workers = max(1, int(workers))
+        self._cache = cache
+        self._chunk_size = chunk_size
+        self._depth = depth
+        if source is None:
+            source = HTTPSource(chunk_size=chunk_size)
+        self._source = source
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def source(self):
+        return self._source
+
+    def open(self, url, key=None, stats=None):
+        """Open a single hourly data file, going through the cache when a
+           cache key is given and the Source is remote. Files read from the
+           Source are written to the cache as they are read.
+
+        :param url   : URL of the hourly data file
+        :type  url   : str
+        :param key   : (node, hour) cache key of the file
+        :type  key   : tuple
+        :param stats : Filled in with where the file came from, the latency
+                       and the bytes read
+        :type  stats : FetchStats
+        :return      : Generator of the chunks of the file, or None if the
+                       file is missing
+        :rtype       : generator
+        """
+        if stats is None:
+            stats = FetchStats(url)
+
+        cached = (self._cache is not None and key is not None and
+                  self._source.remote)
+        if cached:
+            handle = self._cache.open(key)
+            if handle is not None:
+                stats.source = 'cache'
+                stats.latency = time.time() - stats.started
+                return read_chunks(handle, self._chunk_size, stats)
+            if self._cache.is_missing(key):
+                stats.source = 'missing'
+                return None
+
+        chunks = self._source.open(url, stats)
+        if chunks is None:
+            if cached:
+                self._cache.mark_missing(key)
+            return None
+        writer = self._cache.writer(key) if cached else None
+        if writer is not None:
+            return self._store(chunks, writer)
+        return chunks
+
+    def fetch(self, url, key=None):
+        """Download a single hourly data file.
+
+        :param url : URL of the hourly data file
+        :type  url : str
+        :param key : (node, hour) cache key of the file
+        :type  key : tuple
+        :return    : Lines of the file, or None if the file could not be
+                     retrieved
+        :rtype     : list
+        """
+        chunks = self.open(url, key)
+        if chunks is None:
+            return None
+        return list(iter_lines(chunks))
+
+    def fetch_new(self, url, revision, stats=None):
+        """Read whatever has been appended to an hourly data file since it
+           was last read (see Source.open_new). The cache is bypassed since
+           the file is still changing.
+
+        :param url      : URL of the hourly data file
+        :type  url      : str
+        :param revision : Part of the file already read
+        :type  revision : Revision
+        :param stats    : Filled in with the latency and the bytes read
+        :type  stats    : FetchStats
+        :return         : Generator of the chunks of the file after offset
+                          (empty if nothing changed), or None if the file is
+                          missing
+        :rtype          : generator
+        """
+        if stats is None:
+            stats = FetchStats(url)
+        return self._source.open_new(url, revision, stats)
+
+    def fetch_all(self, urls, keys=None, stats=None):
+        """Download hourly data files in parallel, yielding them in the same
+           (chronological) order as the given URLs. Downloads run ahead of
+           the consumer so the caller can parse one hour while the next ones
+           are still in flight. Each file must be read before advancing to
+           the next; whatever is left unread is discarded.
+
+        :param urls  : URLs of the hourly data files
+        :type  urls  : list
+        :param keys  : (node, hour) cache keys matching the URLs
+        :type  keys  : list
+        :param stats : FetchStats matching the URLs; the time the consumer
+                       spends waiting for each file is added to its wait
+        :type  stats : list
+        :return      : Generator of (url, lines) tuples; lines is a generator
+                       of the lines of the file, or None when the file is
+                       missing
+        :rtype       : generator
+        """
+        if not urls:
+            return
+        if keys is None:
+            keys = [None] * len(urls)
+        if stats is None:
+            stats = [None] * len(urls)
+
+        downloads = [Download(url, key, self._depth, fs)
+                     for url, key, fs in zip(urls, keys, stats)]
+        pool = ThreadPool(min(self._workers, len(urls)))
+        try:
+            for download in downloads:
+                pool.apply_async(self._run, (download,))
+
+            for download in downloads:
+                fs = download.stats
+                started = time.time()
+                chunks = download.chunks()
+                if fs is not None:
+                    fs.wait += time.time() - started
+                if chunks is None:
+                    yield download.url, None
+                elif fs is None:
+                    yield download.url, iter_lines(chunks)
+                else:
+                    yield download.url, iter_lines(timed(chunks, fs))
+                download.cancel()
+        finally:
+            for download in downloads:
+                download.cancel()
+            pool.close()
+            pool.join()
+
+    def _run(self, download):
+        # Worker thread: stream one file into its Download, always finishing
+        # with a marker so the consumer never blocks forever
+        if download.cancelled:
+            return
+
+        state = _MISSING
+        try:
+            chunks = self.open(download.url, download.key, download.stats)
+            if chunks is None:
+                return
+
+            state = _EOF
+            download.put(_FOUND)
+            for chunk in chunks:
+                if not download.put(chunk):
+                    chunks.close()
+                    return
+        except Exception as err:
+            state = err
+        finally:
+            download.put(state)
+
+    def _store(self, chunks, writer):
+        # Pass on the chunks, writing them to the cache; the entry is only
+        # kept once the whole file has been read
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+                yield chunk
+            writer.commit()
+            writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
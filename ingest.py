@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime as dt
+import numpy as np
+from series import to_epoch
+
+
+TIME_FORMAT = '%m/%d/%y %H:%M:%S'
+
+# Byte offsets of the digits and separators in a 'mm/dd/yy HH:MM:SS' string
+TIME_WIDTH = 17
+TIME_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16]
+TIME_SEPARATORS = {2: '/', 5: '/', 8: ' ', 11: ':', 14: ':'}
+
+MEMO_SIZE = 65536
+
+BATCH_SIZE = 4096
+
+_memo = {}
+
+
+def iter_lines(chunks):
+    """Reassemble lines from the chunks of a streamed file.
+
+    :param chunks : Chunks of the file
+    :type  chunks : iterable
+    :return       : Generator of the lines of the file
+    :rtype        : generator
+    """
+    tail = ''
+    for chunk in chunks:
+        lines = (tail + chunk).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            yield line + '\n'
+
+    if tail:
+        yield tail
+
+
+def tokenize_lines(lines):
+    """Tokenize a stream of lines (see tokenize), skipping blank lines.
+
+    :param lines : Lines of an hourly data file
+    :type  lines : iterable
+    :return      : Generator of (code, name, timestamp, data) tuples
+    :rtype       : generator
+    """
+    for line in lines:
+        if line.strip():
+            yield tokenize(line)
+
+
+def batch_records(records, size=BATCH_SIZE):
+    """Group a stream of records by sensor code, size records at a time, so
+       that sensors can add them in batches while memory stays bounded.
+
+    :param records : (code, name, timestamp, data) tuples
+    :type  records : iterable
+    :param size    : Number of records per batch
+    :type  size    : int
+    :return        : Generator of {code: [record, ...]} dictionaries
+    :rtype         : generator
+    """
+    batches = {}
+    n = 0
+    for record in records:
+        batches.setdefault(record[0], []).append(record)
+        n += 1
+        if n >= size:
+            yield batches
+            batches = {}
+            n = 0
+
+    if batches:
+        yield batches
+
+
+class LineFilter(object):
+    """LineFilter class for rejecting lines of hourly data files before they
+    are tokenized.
+
+    Lines are judged by their sensor name, the text before the first comma.
+    The first line seen from each sensor is split to learn which types of
+    data the sensor carries, and the verdict is remembered, so every later
+    line from that sensor costs one dictionary lookup. This relies on every
+    line of a sensor carrying the same types of data.
+
+    INSTANCE VARIABLES
+        dtypes  : frozenset : Types of data to keep, None for any
+        codes   : frozenset : Sensor codes to keep, None for any
+        carries : dict      : Types of data carried by each sensor code seen
+                              so far
+    """
+    def __init__(self, dtypes=None, codes=None):
+        self._dtypes = None if dtypes is None else frozenset(dtypes)
+        self._codes = None if codes is None else frozenset(codes)
+        self._verdicts = {}
+        self._carries = {}
+
+    @property
+    def dtypes(self):
+        return self._dtypes
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def carries(self):
+        return self._carries
+
+    def filter(self, lines):
+        """Keep only the lines of the wanted sensors and types of data,
+           skipping blank lines.
+
+        :param lines : Lines of an hourly data file
+        :type  lines : iterable
+        :return      : Generator of the accepted lines
+        :rtype       : generator
+        """
+        verdicts = self._verdicts
+        for line in lines:
+            name = line[:line.find(',')]
+            keep = verdicts.get(name)
+            if keep is None:
+                if not line.strip():
+                    continue
+                keep = self._judge(name, line)
+            if keep:
+                yield line
+
+    def _judge(self, name, line):
+        code = name.split('.', 1)[0]
+        fields = line.rstrip('\r\n').split(',')[2:]
+        types = set(datum.split(';', 1)[0] for datum in fields)
+        self._carries.setdefault(code, set()).update(types)
+
+        keep = ((self._codes is None or code in self._codes) and
+                (self._dtypes is None or not self._dtypes.isdisjoint(types)))
+        self._verdicts[name] = keep
+        return keep
+
+
+def tokenize(line):
+    """Split a formatted line into its parts in a single pass.
+
+    :param line : Formatted line of an hourly data file
+    :type  line : str
+    :return     : (code, name, timestamp, data) tuple where data is a list of
+                  (type, value, unit, context) tuples and the timestamp is
+                  still a string
+    :rtype      : tuple
+    """
+    arr = line.rstrip('\r\n').split(',')
+    name = arr[0]
+
+    data = []
+    for datum in arr[2:]:
+        info = datum.split(';')
+        data.append((info[0], float(info[1]), info[2], info[3]))
+
+    return name.split('.', 1)[0], name, arr[1], data
+
+
+def parse_timestamp(s):
+    """Convert a formatted timestamp string to a datetime object. Results
+       are memoized since many sensors report the same second.
+
+    :param s : Timestamp formatted as 'mm/dd/yy HH:MM:SS'
+    :type  s : str
+    :return  : datetime object representing the timestamp
+    :rtype   : dt.datetime
+    """
+    try:
+        return _memo[s]
+    except KeyError:
+        pass
+
+    if len(_memo) >= MEMO_SIZE:
+        _memo.clear()
+    t = _memo[s] = dt.datetime.strptime(s, TIME_FORMAT)
+    return t
+
+
+def parse_timestamps(strings):
+    """Convert a column of formatted timestamp strings to seconds since the
+       epoch in one vectorized step. Each distinct string is parsed once.
+
+    :param strings : Timestamps formatted as 'mm/dd/yy HH:MM:SS'
+    :type  strings : list
+    :return        : int64 array of seconds since the epoch
+    :rtype         : np.ndarray
+    """
+    if not len(strings):
+        return np.empty(0, dtype=np.int64)
+
+    uniq, inverse = np.unique(np.asarray(strings), return_inverse=True)
+    epochs = _parse_fixed(uniq)
+    if epochs is None:
+        epochs = np.array([to_epoch(dt.datetime.strptime(s, TIME_FORMAT))
+                           for s in uniq], dtype=np.int64)
+
+    return epochs[inverse]
+
+
+def _parse_fixed(uniq):
+    # Parse 'mm/dd/yy HH:MM:SS' byte strings arithmetically; returns None if
+    # any string does not match the layout so the caller can fall back on
+    # strptime (and its error reporting)
+    if uniq.dtype.kind != 'S' or uniq.dtype.itemsize != TIME_WIDTH:
+        return None
+
+    chars = uniq.view(np.uint8).reshape(-1, TIME_WIDTH)
+    for i, sep in TIME_SEPARATORS.iteritems():
+        if (chars[:, i] != ord(sep)).any():
+            return None
+
+    digits = chars[:, TIME_DIGITS].astype(np.int64) - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        return None
+
+    fields = digits[:, 0::2] * 10 + digits[:, 1::2]
+    mm, dd, yy, hh, mi, ss = fields.T
+    if ((mm < 1) | (mm > 12) | (dd < 1) | (hh > 23) | (mi > 59) |
+            (ss > 59)).any():
+        return None
+
+    # Same pivot as strptime's %y: 69-99 are 1900s, 00-68 are 2000s
+    years = np.where(yy < 69, yy + 2000, yy + 1900)
+    months = ((years - 1970) * 12 + mm - 1).astype('M8[M]')
+    first = months.astype('M8[D]').astype(np.int64)
+    if (dd > (months + 1).astype('M8[D]').astype(np.int64) - first).any():
+        return None
+
+    days = first + dd - 1
+    return days * 86400 + hh * 3600 + mi * 60 + ss
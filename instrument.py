@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import time
+
+
+# Stages of the ingest pipeline timed by IngestStats
+STAGES = ['fetch', 'tokenize', 'append']
+
+
+def timed(iterable, stats):
+    """Pass on the items of an iterable, adding the time spent waiting for
+       each one to stats.wait.
+
+    :param iterable : Chunks or lines of a file
+    :type  iterable : iterable
+    :param stats    : Statistics of the file
+    :type  stats    : FetchStats
+    :return         : Generator of the items
+    :rtype          : generator
+    """
+    it = iter(iterable)
+    while True:
+        started = time.time()
+        try:
+            item = next(it)
+        finally:
+            stats.wait += time.time() - started
+        yield item
+
+
+class FetchStats(object):
+    """FetchStats class for the measurements of one hourly data file.
+
+    INSTANCE VARIABLES
+        url           : str   : URL of the file
+        source        : str   : 'network', 'cache', 'local' (a directory or
+                                archive), 'missing' or 'failed'
+        latency       : float : Seconds from the request to the response
+        elapsed       : float : Seconds from the request to the last byte
+        bytes         : int   : Number of bytes read
+        wait          : float : Seconds the parser waited for data
+        lines         : int   : Number of lines read
+        parse         : float : Seconds spent parsing and storing the lines
+        lines_per_sec : float : Lines parsed per second
+    """
+    def __init__(self, url):
+        self.url = url
+        self.source = None
+        self.started = time.time()
+        self.latency = None
+        self.elapsed = None
+        self.bytes = 0
+        self.wait = 0.0
+        self.lines = 0
+        self.parse = 0.0
+
+    def __repr__(self):
+        tmpl = 'FetchStats({}, source={}, bytes={}, lines={})'
+        return tmpl.format(self.url, self.source, self.bytes, self.lines)
+
+    @property
+    def lines_per_sec(self):
+        if not self.parse:
+            return None
+        return self.lines / self.parse
+
+    def to_dict(self):
+        """Plain (JSON serializable) representation of the measurements.
+
+        :return : Dictionary of the measurements
+        :rtype  : dict
+        """
+        return {'url': self.url,
+                'source': self.source,
+                'latency': self.latency,
+                'elapsed': self.elapsed,
+                'bytes': self.bytes,
+                'wait': self.wait,
+                'lines': self.lines,
+                'parse': self.parse,
+                'lines_per_sec': self.lines_per_sec}
+
+
+class IngestStats(object):
+    """IngestStats class for instrumenting the pulls of a Node or AoT.
+
+    Timings are taken per file, per chunk and per batch of lines, never per
+    line, so instrumentation costs next to nothing.
+
+    INSTANCE VARIABLES
+        files         : list     : FetchStats of every file requested
+        stages        : dict     : Seconds spent in each stage: 'fetch'
+                                   (waiting for the network or cache),
+                                   'tokenize' (filtering and splitting lines,
+                                   converting values) and 'append' (parsing
+                                   timestamps, storing readings)
+        points        : dict     : Number of records added to each sensor
+        bytes         : int      : Number of bytes read
+        lines         : int      : Number of lines read
+        lines_per_sec : float    : Lines parsed per second
+        callback      : function : Called with the FetchStats of each file
+                                   once it has been ingested
+    """
+    def __init__(self, callback=None):
+        self._files = []
+        self._stages = {stage: 0.0 for stage in STAGES}
+        self._points = {}
+        self._callback = callback
+
+    def __repr__(self):
+        tmpl = 'IngestStats(files={}, bytes={}, lines={}, stages={})'
+        return tmpl.format(len(self._files), self.bytes, self.lines,
+                           self._stages)
+
+    @property
+    def files(self):
+        return self._files
+
+    @property
+    def stages(self):
+        return self._stages
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def bytes(self):
+        return sum(f.bytes for f in self._files)
+
+    @property
+    def lines(self):
+        return sum(f.lines for f in self._files)
+
+    @property
+    def lines_per_sec(self):
+        seconds = self._stages['tokenize'] + self._stages['append']
+        if not seconds:
+            return None
+        return self.lines / seconds
+
+    @property
+    def callback(self):
+        return self._callback
+
+    def add_file(self, stats):
+        """Record a file that has been ingested (or found missing).
+
+        :param stats : Measurements of the file
+        :type  stats : FetchStats
+        :return      : None
+        :rtype       : None
+        """
+        self._files.append(stats)
+        if self._callback is not None:
+            self._callback(stats)
+
+    def add_time(self, stage, seconds):
+        """Add time spent in a stage of the pipeline.
+
+        :param stage   : Name of the stage (see STAGES)
+        :type  stage   : str
+        :param seconds : Time spent
+        :type  seconds : float
+        :return        : None
+        :rtype         : None
+        """
+        self._stages[stage] += seconds
+
+    def add_points(self, code, n):
+        """Count records added to a sensor.
+
+        :param code : Sensor code
+        :type  code : str
+        :param n    : Number of records
+        :type  n    : int
+        :return     : None
+        :rtype      : None
+        """
+        self._points[code] = self._points.get(code, 0) + n
+
+    def merge(self, other):
+        """Combine with the measurements of another pull.
+
+        :param other : Measurements to combine with
+        :type  other : IngestStats
+        :return      : Measurements of both pulls
+        :rtype       : IngestStats
+        """
+        merged = IngestStats(self._callback)
+        for stats in (self, other):
+            merged._files.extend(stats._files)
+            for stage, seconds in stats._stages.iteritems():
+                merged.add_time(stage, seconds)
+            for code, n in stats._points.iteritems():
+                merged.add_points(code, n)
+        return merged
+
+    def to_dict(self):
+        """Plain (JSON serializable) representation of the measurements.
+
+        :return : Dictionary of the measurements
+        :rtype  : dict
+        """
+        return {'files': [f.to_dict() for f in self._files],
+                'stages': dict(self._stages),
+                'points': dict(self._points),
+                'bytes': self.bytes,
+                'lines': self.lines,
+                'lines_per_sec': self.lines_per_sec}
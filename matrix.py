@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import numpy as np
+from resample import to_seconds
+
+
+# Aggregations of the readings falling in one cell of a Matrix
+HOW = ('mean', 'sum', 'min', 'max', 'last')
+
+# Channels of a sensor in the order of its types (see Sensor.dtype)
+CHANNEL_ORDER = ('values', 'values2', 'frames')
+
+
+def sensor_columns(node, sensor, dtypes=None):
+    """Split a sensor into one timeseries per type of data, e.g. the two
+       channels of a DualSensor or the ambient and 16 pixel channels of a
+       GridSensor. Pixel channels are labelled <type>[<pixel>], and the
+       ambient channel by its context (PTAT), as in GridSensor.summary.
+
+    :param node   : Name of the Node the sensor belongs to
+    :type  node   : str
+    :param sensor : The sensor
+    :type  sensor : Sensor
+    :param dtypes : Types of data to keep, None for all
+    :type  dtypes : list
+    :return       : List of ((node, code, type), epochs, values) tuples
+    :rtype        : list
+    """
+    names = [dtype[0] for dtype in sensor.dtype]
+    if 'frames' in sensor.CHANNELS and names:
+        names[0] = sensor.context[0]
+    names = iter(names)
+    columns = []
+    for channel in CHANNEL_ORDER:
+        if channel not in sensor.CHANNELS:
+            continue
+        series = getattr(sensor, sensor.CHANNELS[channel])
+        values = series.values.reshape(len(series), -1)
+        for i in range(values.shape[1]):
+            name = next(names, None)
+            if dtypes and name not in dtypes:
+                continue
+            if channel == 'frames':
+                name = '{}[{}]'.format(name, i)
+            columns.append(((node, sensor.code, name), series.epochs,
+                            values[:, i]))
+    return columns
+
+
+def align(columns, window, how='mean', origin=None):
+    """Put many timeseries on one time grid in a single vectorized pass:
+       every reading is binned by (time bucket, column) and the buckets are
+       aggregated with bincount or reduceat, never with a join per pair of
+       series. NaN readings count as missing.
+
+    :param columns : List of (label, epochs, values) tuples, one per column
+    :type  columns : list
+    :param window  : Width of the time buckets
+    :type  window  : dt.timedelta
+    :param how     : Aggregation of the readings in a bucket (see HOW)
+    :type  how     : str
+    :param origin  : Start of the first bucket in seconds since the epoch,
+                     defaults to the first timestamp rounded down to a
+                     multiple of window; earlier readings are dropped
+    :type  origin  : int
+    :return        : The aligned readings
+    :rtype         : Matrix
+    """
+    window = to_seconds(window)
+    if window <= 0:
+        raise ValueError("window must be positive")
+    if how not in HOW:
+        raise ValueError("how must be one of " + ', '.join(HOW))
+
+    labels = [column[0] for column in columns]
+    ncols = len(columns)
+    sizes = [len(column[1]) for column in columns]
+    epochs = np.concatenate([np.asarray(column[1], dtype=np.int64)
+                             for column in columns] or [[]]).astype(np.int64)
+    values = np.concatenate([np.asarray(column[2], dtype=np.float64)
+                             for column in columns] or [[]])
+    cols = np.repeat(np.arange(ncols), sizes)
+
+    if origin is None:
+        origin = int(epochs.min()) // window * window if len(epochs) else 0
+    bins = (epochs - origin) // window
+    keep = (bins >= 0) & ~np.isnan(values)
+    if not keep.all():
+        epochs, values, cols, bins = (epochs[keep], values[keep], cols[keep],
+                                      bins[keep])
+
+    nrows = int(bins.max()) + 1 if len(bins) else 0
+    cells = bins * ncols + cols
+    count = np.bincount(cells, minlength=nrows * ncols)
+
+    if how in ('mean', 'sum'):
+        out = np.asarray(np.bincount(cells, values, minlength=nrows * ncols),
+                         dtype=np.float64)
+        if how == 'mean':
+            with np.errstate(invalid='ignore'):
+                out /= count
+        out[count == 0] = np.nan
+    else:
+        # A column in time order holds each of its cells as one run of
+        # readings in time order, so the runs are reduced in place; if any
+        # column goes back in time, even within a cell, everything is sorted
+        # by cell (then time) first
+        if ((np.diff(epochs) < 0) & (np.diff(cols) == 0)).any():
+            order = np.lexsort((epochs, cells))
+            cells, values = cells[order], values[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(cells)) + 1))
+        out = np.full(nrows * ncols, np.nan)
+        if len(cells):
+            if how == 'last':
+                picked = values[np.append(starts[1:], len(cells)) - 1]
+            else:
+                reduce = np.minimum if how == 'min' else np.maximum
+                picked = reduce.reduceat(values, starts)
+            out[cells[starts]] = picked
+
+    epochs = origin + np.arange(nrows, dtype=np.int64) * window
+    return Matrix(window, origin, epochs, labels,
+                  out.reshape(nrows, ncols), count.reshape(nrows, ncols))
+
+
+class Matrix(object):
+    """Matrix class for readings of many nodes and sensors on a common time
+    grid: one row per time bucket, one column per (node, sensor, type)
+    channel. Buckets without a reading are NaN in values and True in mask.
+
+    INSTANCE VARIABLES
+        window   : int   : Width of the buckets in seconds
+        origin   : int   : Start of the first bucket (epoch seconds)
+        epochs   : array : int64 start of each bucket (epoch seconds)
+        times    : array : datetime64 start of each bucket
+        channels : list  : (node, code, type) label of each column
+        values   : array : (time x channel) float64 aggregated readings
+        count    : array : (time x channel) number of readings per cell
+        mask     : array : (time x channel) True where there is no reading
+    """
+    def __init__(self, window, origin, epochs, channels, values, count):
+        self._window = window
+        self._origin = origin
+        self._epochs = epochs
+        self._channels = channels
+        self._values = values
+        self._count = count
+
+    def __len__(self):
+        return len(self._epochs)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def origin(self):
+        return self._origin
+
+    @property
+    def epochs(self):
+        return self._epochs
+
+    @property
+    def times(self):
+        return self._epochs.view('M8[s]')
+
+    @property
+    def channels(self):
+        return self._channels
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mask(self):
+        return self._count == 0
+
+    def columns(self, node=None, code=None, dtype=None):
+        """Indices of the columns of some nodes, sensors or types of data,
+           e.g. m.values[:, m.columns(dtype='Temperature')]. A type matches
+           the pixel columns of a GridSensor too ('Temperature' matches
+           'Temperature[5]').
+
+        :param node  : Name of the Node, None for any
+        :type  node  : str
+        :param code  : Sensor code, None for any
+        :type  code  : str
+        :param dtype : Type of data, None for any
+        :type  dtype : str
+        :return      : Indices of the matching columns
+        :rtype       : list
+        """
+        return [i for i, (n, c, d) in enumerate(self._channels)
+                if node in (None, n) and code in (None, c) and
+                dtype in (None, d, str(d).split('[', 1)[0])]
@@ -1,10 +1,19 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import urllib2
+import os
+import copy
+import json
+import time
 import datetime as dt
+from itertools import izip
 from ConfigParser import ConfigParser
-from constants import SENSOR_CODES, GRID_SENSOR, DATA_URI
+from constants import SENSOR_CODES, GRID_SENSOR, FETCH_WORKERS
+from constants import MISSING_EXPIRY, PARSE_WORKERS
 from sensor import Sensor, GridSensor, DualSensor
+from fetch import Fetcher, Revision, FetchError
+from ingest import iter_lines, tokenize_lines, batch_records, LineFilter
+from instrument import FetchStats, IngestStats, timed
+from scheduler import Scheduler
 import numpy as np
 import matplotlib as mtplt
 import matplotlib.pyplot as plt
@@ -16,6 +25,71 @@ import scipy.stats as stats
 # config = ConfigParser('config.ini')
 
 
+SENSOR_TYPES = {'MLX90614ESF-DAA': Sensor,
+                'D6T-44L-06': GridSensor,
+                'TMP421': Sensor,
+                'BMP180': DualSensor,
+                'PDV_P8104': Sensor,
+                'Thermistor_NTC_PR103J2': Sensor,
+                'HIH6130': DualSensor,
+                'SHT15': DualSensor,
+                'DS18B20': Sensor,
+                'RHT03': DualSensor,
+                'SHT75': DualSensor,
+                'HIH4030': Sensor,
+                'GA1A1S201WP': Sensor,
+                'MAX4466': Sensor,
+                'HTU21D': DualSensor,
+                'TMP102': Sensor}
+
+SENSOR_CLASSES = {cls.__name__: cls for cls in (Sensor, DualSensor, GridSensor)}
+
+HOUR_FORMAT = '%Y-%m-%d %H'
+
+CHECKED_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Kinds of gaps in the data (see Node.gaps)
+MISSING = 'missing'
+EMPTY = 'empty'
+PARTIAL = 'partial'
+FAILED = 'failed'
+NO_DATA = 'no data'
+
+# LineFilters of the parse processes, kept per (dtypes, codes)
+_line_filters = {}
+
+
+def parse_hour(data, dtypes=None, codes=None):
+    """Parse the contents of one hourly data file into packed arrays per
+       sensor (see Sensor.pack_records). Run in the parse processes of a
+       Scheduler, so only compact arrays travel back to the Node.
+
+    :param data   : Contents of the hourly data file
+    :type  data   : str
+    :param dtypes : Set of the types of data to keep, None for all
+    :type  dtypes : set
+    :param codes  : Sensor codes to keep, None for all
+    :type  codes  : list
+    :return       : ({code: packed batch}, number of lines, seconds taken)
+                    tuple
+    :rtype        : tuple
+    """
+    started = time.time()
+    key = (dtypes and frozenset(dtypes), codes and frozenset(codes))
+    line_filter = _line_filters.get(key)
+    if line_filter is None:
+        line_filter = _line_filters[key] = LineFilter(dtypes, codes)
+
+    lines = data.splitlines(True)
+    records = {}
+    for record in tokenize_lines(line_filter.filter(lines)):
+        records.setdefault(record[0], []).append(record)
+
+    packed = {code: SENSOR_TYPES.get(code, Sensor).pack_records(batch)
+              for code, batch in records.iteritems()}
+    return packed, len(lines), time.time() - started
+
+
 class Node(object):
     """Node class for encapsulating AoT sensor data:
 
@@ -24,10 +98,49 @@ class Node(object):
         sensors  : dict    : Dictionary of Sensor objects
         strt_dte : str     : Starting date for AoT data retrieval
         stp_dte  : str     : Ending date for AoT data retrieval
+        fetcher  : Fetcher : Downloads the hourly data files in parallel,
+                             reading them from the Cache first if one is given
+        source   : Source  : Where the hourly data files are read from: the
+                             data host (HTTPSource, the default), a local
+                             directory tree or an archive
+        dtypes   : list    : Types of data pulled, None for all sensors
+        hours    : dict    : Hours already ingested: {hour: None} once the
+                             hourly file is complete, {hour: Revision} while
+                             it is still being written
+        lazy     : bool    : True if data is only pulled once a sensor is
+                             first used
+        codes    : list    : Sensor codes pulled, None for all sensors
+        missing_expiry : int : Seconds before an hour found missing upstream
+                               is asked for again
+        stats    : IngestStats : Timings, bytes, line and record counts of
+                                 everything pulled
+        parsers  : int     : Number of processes parsing pulls that span
+                             several days, 0 to parse as files arrive
+
+    Given a Scheduler (as AoT does), the hourly files are downloaded and
+    parsed by the Scheduler's threads and processes, shared with other
+    Nodes, instead of on the Node's own Fetcher threads. A pull spanning
+    several days without one gets a Scheduler of its own with parsers
+    processes, so parsing long ranges scales with the number of CPUs.
     """
 
-    def __init__(self, node, dtypes=None, strt=None, stp=None):
+    def __init__(self, node, dtypes=None, strt=None, stp=None,
+                 workers=FETCH_WORKERS, cache=None, lazy=False, codes=None,
+                 missing_expiry=MISSING_EXPIRY, stats_callback=None,
+                 scheduler=None, source=None, parsers=PARSE_WORKERS):
         self._node = node
+        self._fetcher = Fetcher(workers, cache, source=source)
+        self._parsers = parsers
+        self._dtypes = dtypes or None
+        self._codes = codes or None
+        self._missing_expiry = missing_expiry
+        self._filters = {}
+        self._hours = {}
+        self._gaps = {}
+        self._lazy = lazy
+        self._deferred = []
+        self._pending = {}
+        self._stats = IngestStats(stats_callback)
         
         if strt == None and stp == None:
             today = dt.datetime.now()
@@ -37,30 +150,30 @@ class Node(object):
             self._strt_dte = ydate
             self._stp_dte = ydate
             if not dtypes:
-                self._sensors = {k: [] for k in SENSOR_CODES}
-                self.pull_all(ydate, ydate)
+                self._sensors = {}
+                self.pull_all(ydate, ydate, scheduler)
             else:
                 self._sensors = {}
-                self.pull_select(dtypes, ydate, ydate)
+                self.pull_select(dtypes, ydate, ydate, scheduler)
         
         elif stp == None:
             self._strt_dte = strt
             self._stp_dte = strt
             if not dtypes:
-                self._sensors = {k: [] for k in SENSOR_CODES}
-                self.pull_all(strt, strt)
+                self._sensors = {}
+                self.pull_all(strt, strt, scheduler)
             else:
                 self._sensors = {}
-                self.pull_select(dtypes, strt, strt)
+                self.pull_select(dtypes, strt, strt, scheduler)
         else:
             self._strt_dte = strt
             self._stp_dte = stp
             if not dtypes:
-                self._sensors = {k: [] for k in SENSOR_CODES}
-                self.pull_all(strt, stp)
+                self._sensors = {}
+                self.pull_all(strt, stp, scheduler)
             else:
                 self._sensors = {}
-                self.pull_select(dtypes, strt, stp)
+                self.pull_select(dtypes, strt, stp, scheduler)
 
     @property
     def latlon(self):
@@ -72,6 +185,7 @@ class Node(object):
 
     @property
     def sensors(self):
+        self._load()
         return self._sensors
     
     @property
@@ -82,10 +196,47 @@ class Node(object):
     def stp_dte(self):
         return self._stp_dte
 
+    @property
+    def fetcher(self):
+        return self._fetcher
+
+    @property
+    def source(self):
+        return self._fetcher.source
+
+    @property
+    def parsers(self):
+        return self._parsers
+
+    @property
+    def dtypes(self):
+        return self._dtypes
+
+    @property
+    def hours(self):
+        return self._hours
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def codes(self):
+        return self._codes
+
+    @property
+    def missing_expiry(self):
+        return self._missing_expiry
+
+    @property
+    def stats(self):
+        return self._stats
+
     def sensor(self, code):
-        return next((v for k, v in self.sensors.iteritems() if k == code), None)
+        self._load(code)
+        return self._sensors.get(code)
 
-    def pull_all(self, strt, stp):
+    def pull_all(self, strt, stp, scheduler=None):
         """Pull the AoT sensor data from the specified start time to
         the specified stop time; store the data in the Sensor objects of
         the sensors dictionary.
@@ -96,47 +247,25 @@ class Node(object):
         :param stp  : Last date from which data will be pulled
         :type  stp  : str
 
+        :param scheduler : Optional Scheduler shared with other Nodes
+        :type  scheduler : Scheduler
+
         :return     : This method stores the data from wa8.gl in appropriate
                       Sensor objects
         :rtype      : None
 
         """
-        urls = self.makeURLs(strt, stp)
-        sensors = {'MLX90614ESF-DAA': Sensor,
-                       'D6T-44L-06': GridSensor,
-                       'TMP421': Sensor,
-                       'BMP180': DualSensor,
-                       'PDV_P8104': Sensor,
-                       'Thermistor_NTC_PR103J2': Sensor,
-                       'HIH6130': DualSensor,
-                       'SHT15': DualSensor,
-                       'DS18B20': Sensor,
-                       'RHT03': DualSensor,
-                       'SHT75': DualSensor,
-                       'HIH4030': Sensor,
-                       'GA1A1S201WP': Sensor,
-                       'MAX4466': Sensor,
-                       'HTU21D': DualSensor}
-        
-        for k, v in sensors.iteritems():
-            self._sensors[k] = v(k)
+        for code in SENSOR_CODES:
+            if self._codes is None or code in self._codes:
+                self._sensors[code] = SENSOR_TYPES[code](code)
 
-        for url in urls:
-            try:
-                request = urllib2.Request(url)
-                handle = urllib2.urlopen(request)
-                lines = handle.readlines()
-
-                for line in lines:
-                    code = line.split(',')[0].split('.')[0]
-                    self.sensor(code).add_point(line)
-            except:
-                print "Missing data from: " + url
+        self.pull(strt, stp, scheduler=scheduler)
                 
-        grid = self.sensor('D6T-44L-06')
-        grid.sort_by_pixel()
+        if 'D6T-44L-06' in self._sensors:
+            grid = self._sensors['D6T-44L-06']
+            grid.sort_by_pixel()
         
-    def pull_select(self, dtypes, strt, stp):
+    def pull_select(self, dtypes, strt, stp, scheduler=None):
         """Pull the designated AoT sensor data from the specified start time to
         the specified stop time; store the data in the Sensor objects of
         the sensors dictionary.
@@ -150,74 +279,589 @@ class Node(object):
         :param stp    : Last date from which data will be pulled
         :type  stp    : str
 
+        :param scheduler : Optional Scheduler shared with other Nodes
+        :type  scheduler : Scheduler
+
         :return       : This method stores the data from wa8.gl in appropriate
                         Sensor objects
                         
         :rtype        : None
 
         """
-        urls = self.makeURLs(strt, stp)
-        sensors = {'MLX90614ESF-DAA': Sensor,
-                       'D6T-44L-06': GridSensor,
-                       'TMP421': Sensor,
-                       'BMP180': DualSensor,
-                       'PDV_P8104': Sensor,
-                       'Thermistor_NTC_PR103J2': Sensor,
-                       'HIH6130': DualSensor,
-                       'SHT15': DualSensor,
-                       'DS18B20': Sensor,
-                       'RHT03': DualSensor,
-                       'SHT75': DualSensor,
-                       'HIH4030': Sensor,
-                       'GA1A1S201WP': Sensor,
-                       'MAX4466': Sensor,
-                       'HTU21D': DualSensor,
-                       'TMP102': Sensor}
-        
-        samp_url = urls[0]
-        try:
-            request = urllib2.Request(samp_url)
-            handle = urllib2.urlopen(request)
-            lines = handle.readlines()
-
-            for line in lines[:15]:
-                arr = self.get_type_from_line(line)
-                if set(arr).intersection(dtypes):
-                    code = line.split(',')[0].split('.')[0]
-                    self._sensors[code] = sensors[code](code)
-                    self.sensor(code).add_point(line)
-
-            for line in lines[15:]:
-                arr = self.get_type_from_line(line)
-                if set(arr).intersection(dtypes):
-                    code = line.split(',')[0].split('.')[0]
-                    try:
-                        self.sensor(code).add_point(line)
-                    except:
-                        self._sensors[code] = sensors[code](code)
-                        self.sensor(code).add_point(line)
-
-        except urllib2.HTTPError, err:
-            print "Invalid URL: " + url
-        
-        for url in urls[1:]:
-            try:
-                request = urllib2.Request(url)
-                handle = urllib2.urlopen(request)
-                lines = handle.readlines()
-
-                for line in lines:
-                    arr = self.get_type_from_line(line)
-                    if set(arr).intersection(dtypes):
-                        code = line.split(',')[0].split('.')[0]
-                        self.sensor(code).add_point(line)
-                    
-            except urllib2.HTTPError, err:
-                print "Invalid URL: " + url
+        self.pull(strt, stp, dtypes, scheduler)
                 
-        if 'D6T-44L-06' in self._sensors.keys():
+        if 'D6T-44L-06' in self._sensors:
             grid = self._sensors['D6T-44L-06']
             grid.sort_by_pixel()
+
+    def pull(self, strt, stp, dtypes=None, scheduler=None):
+        """Download the hourly data files from the specified start time to
+        the specified stop time and route every line to its Sensor. Without
+        dtypes, lines of sensors that are not in the sensors dictionary are
+        skipped; with dtypes, only lines containing one of the types are
+        kept and Sensor objects are created as needed.
+
+        :param strt   : First date from which to start pulling data
+        :type  strt   : str
+
+        :param stp    : Last date from which data will be pulled
+        :type  stp    : str
+
+        :param dtypes : List of the types of data to be pulled
+        :type  dtypes : List
+
+        :param scheduler : Optional Scheduler shared with other Nodes; lazy
+                           Nodes do not use it
+        :type  scheduler : Scheduler
+
+        :return       : None
+        :rtype        : None
+        """
+        if self._lazy:
+            self._deferred.append((strt, stp, dtypes))
+            return
+
+        urls = self.makeURLs(strt, stp)
+        keys = self.makeKeys(strt, stp)
+        self._pull_hours(urls, keys, dtypes, scheduler=scheduler)
+
+    def _load(self, code=None):
+        # Lazy mode: download the deferred hours once, keeping their lines
+        # grouped by sensor code, then parse the lines of one sensor (or of
+        # all of them when code is None)
+        if self._deferred:
+            deferred, self._deferred = self._deferred, []
+            for strt, stp, dtypes in deferred:
+                urls = self.makeURLs(strt, stp)
+                keys = self.makeKeys(strt, stp)
+                self._pull_hours(urls, keys, dtypes, stash=True)
+
+        if not self._pending:
+            return
+        codes = self._pending.keys() if code is None else [code]
+        for code in codes:
+            for url, lines, dtypes in self._pending.pop(code, ()):
+                appended = self._stats.stages['append']
+                started = time.time()
+                try:
+                    self.ingest(lines, dtypes)
+                except (ValueError, IndexError):
+                    print "Missing data from: " + url
+                appended = self._stats.stages['append'] - appended
+                self._stats.add_time('tokenize',
+                                     time.time() - started - appended)
+
+            sensor = self._sensors.get(code)
+            if isinstance(sensor, GridSensor):
+                sensor.sort_by_pixel()
+
+    def _stash(self, lines, url, dtypes):
+        # Group the lines of an hourly file by sensor code without parsing
+        # them; each sensor parses its own lines when it is first used
+        groups = {}
+        for line in self._line_filter(dtypes).filter(lines):
+            code = line.split(',', 1)[0].split('.', 1)[0]
+            groups.setdefault(code, []).append(line)
+
+        for code, group in groups.iteritems():
+            self._pending.setdefault(code, []).append((url, group, dtypes))
+
+    def refresh(self, stp=None, scheduler=None):
+        """Bring the Node up to date without downloading anything twice:
+        hours from strt_dte to stp that have not been ingested yet are
+        pulled, and hourly files that were still being written when they
+        were read are asked only for the bytes appended since (see
+        Fetcher.fetch_new). Hours that have not started are skipped.
+
+        :param stp       : New last date from which data will be pulled,
+                           defaults to today
+        :type  stp       : str
+        :param scheduler : Optional Scheduler shared with other Nodes, used
+                           for the hours not ingested yet
+        :type  scheduler : Scheduler
+        :return          : None
+        :rtype           : None
+        """
+        self._load()
+        now = dt.datetime.now()
+        if stp is None:
+            # Today, written with as many year digits as strt_dte
+            if len(self._strt_dte.split('-')[2]) == 4:
+                stp = now.strftime("%m-%d-%Y")
+            else:
+                stp = now.strftime("%m-%d-%y")
+        self._stp_dte = stp
+
+        dtypes = self._dtypes
+        if dtypes is not None:
+            dtypes = set(dtypes)
+
+        urls = []
+        keys = []
+        for url, key in izip(self.makeURLs(self._strt_dte, stp),
+                             self.makeKeys(self._strt_dte, stp)):
+            hour = key[1]
+            if hour > now:
+                break
+            if hour not in self._hours:
+                urls.append(url)
+                keys.append(key)
+                continue
+
+            revision = self._hours[hour]
+            if revision is None:
+                continue
+
+            revision = copy.copy(revision)
+            fetch_stats = FetchStats(url)
+            try:
+                chunks = self._fetcher.fetch_new(url, revision, fetch_stats)
+            except FetchError as err:
+                print "Failed to download: " + str(err)
+                chunks = None
+            else:
+                if chunks is None:
+                    print "Missing data from: " + url
+            fetch_stats.wait = time.time() - fetch_stats.started
+            if chunks is None:
+                self._stats.add_time('fetch', fetch_stats.wait)
+                self._stats.add_file(fetch_stats)
+                continue
+            lines = iter_lines(timed(chunks, fetch_stats))
+            self._ingest_hour(url, hour, lines, revision, dtypes, now,
+                              fetch_stats)
+
+        self._pull_hours(urls, keys, dtypes, scheduler=scheduler)
+
+    def _pull_hours(self, urls, keys, dtypes=None, stash=False,
+                    scheduler=None):
+        # Download and ingest (or stash) the given hours, recording them in
+        # hours
+        if dtypes is not None:
+            dtypes = set(dtypes)
+
+        now = dt.datetime.now()
+        wanted = [(url, key) for url, key in izip(urls, keys)
+                  if not self._known_missing(key[1], now)]
+        urls = [url for url, key in wanted]
+        keys = [key for url, key in wanted]
+
+        if scheduler is not None and not stash:
+            self._pull_scheduled(urls, keys, dtypes, now, scheduler)
+            return
+
+        days = set(key[1].date() for key in keys)
+        if self._parsers and len(days) > 1 and not stash:
+            # Long ranges are parsed in processes; the files of a single
+            # day are not worth starting them for
+            with Scheduler(self._fetcher.workers, self._parsers) as scheduler:
+                self._pull_scheduled(urls, keys, dtypes, now, scheduler)
+            return
+
+        fetch_stats = [FetchStats(url) for url in urls]
+        files = self._fetcher.fetch_all(urls, keys, fetch_stats)
+        for (url, lines), key, fs in izip(files, keys, fetch_stats):
+            if lines is None:
+                print "Missing data from: " + url
+                self._gaps[key[1]] = (MISSING, now)
+                self._stats.add_time('fetch', fs.wait)
+                self._stats.add_file(fs)
+                continue
+            self._ingest_hour(url, key[1], lines, Revision(), dtypes, now,
+                              fs, stash)
+
+    def _known_missing(self, hour, now):
+        # True if the hour was already over when it was found missing, and
+        # that was less than missing_expiry seconds ago
+        gap = self._gaps.get(hour)
+        if gap is None or gap[0] != MISSING:
+            return False
+        checked = gap[1]
+        if hour + dt.timedelta(hours=1) > checked:
+            return False
+        age = now - checked
+        return age.days * 86400 + age.seconds < self._missing_expiry
+
+    def _ingest_hour(self, url, hour, lines, revision, dtypes, now,
+                     fetch_stats, stash=False):
+        # Ingest (part of) one hourly file. revision records how far the
+        # file was read, so if it may still be written to, or its download
+        # failed part way, the rest can be requested later. Time spent
+        # waiting for the file is told apart from time spent parsing it by
+        # the wait recorded in fetch_stats
+        complete = hour + dt.timedelta(hours=1) <= now
+        start = revision.offset
+        failure = []
+        lines = self._tracked_lines(lines, revision, complete, failure,
+                                    fetch_stats)
+
+        appended = self._stats.stages['append']
+        points = sum(self._stats.points.itervalues())
+        waited = fetch_stats.wait
+        started = time.time()
+        unparsed = False
+        try:
+            if stash:
+                self._stash(lines, url, dtypes)
+            else:
+                self.ingest(lines, dtypes)
+        except (ValueError, IndexError, IOError):
+            print "Missing data from: " + url
+            unparsed = True
+        appended = self._stats.stages['append'] - appended
+        waited = fetch_stats.wait - waited
+        fetch_stats.parse = time.time() - started - waited
+        self._stats.add_time('fetch', fetch_stats.wait)
+        self._stats.add_time('tokenize', fetch_stats.parse - appended)
+        self._stats.add_file(fetch_stats)
+        if unparsed:
+            kept = sum(self._stats.points.itervalues()) > points
+            self._record_unparsed(hour, kept, now)
+        else:
+            self._record_hour(hour, revision, start, complete, failure, now)
+
+    def _pull_scheduled(self, urls, keys, dtypes, now, scheduler):
+        # Hand the hours to a Scheduler shared with other Nodes and ingest
+        # the arrays parsed in its processes, in chronological order. The
+        # time spent waiting for each file (download and parse) counts as
+        # fetch time; the time its parse process took counts as tokenize
+        codes = self._filter_codes(dtypes)
+
+        files = [(url, key, FetchStats(url),
+                  key[1] + dt.timedelta(hours=1) <= now)
+                 for url, key in izip(urls, keys)]
+        for job in scheduler.run(self._fetcher, files, parse_hour,
+                                 (dtypes, codes)):
+            hour = job.key[1]
+            fetch_stats = job.stats
+            started = time.time()
+            unparsed = False
+            try:
+                parsed = job.get()
+            except (ValueError, IndexError, IOError):
+                print "Missing data from: " + job.url
+                parsed = None
+                unparsed = True
+            fetch_stats.wait = time.time() - started
+            self._stats.add_time('fetch', fetch_stats.wait)
+
+            if job.missing:
+                print "Missing data from: " + job.url
+                self._gaps[hour] = (MISSING, now)
+                self._stats.add_file(fetch_stats)
+                continue
+
+            if parsed is not None:
+                packed, fetch_stats.lines, seconds = parsed
+                appended = self._stats.stages['append']
+                self.ingest_packed(packed, dtypes)
+                appended = self._stats.stages['append'] - appended
+                fetch_stats.parse = seconds + appended
+                self._stats.add_time('tokenize', seconds)
+            self._stats.add_file(fetch_stats)
+
+            if unparsed:
+                # Nothing of the file was ingested
+                self._record_unparsed(hour, False, now)
+                continue
+            failure = [job.error] if job.error is not None else []
+            self._record_hour(hour, Revision(job.size), 0, job.complete,
+                              failure, now)
+
+    def _record_hour(self, hour, revision, start, complete, failure, now):
+        # Record how far an hourly file was ingested (from byte start to
+        # revision.offset) in hours and gaps
+        if failure:
+            print "Failed to download: " + str(failure[0])
+            if revision.offset > start:
+                self._hours[hour] = revision
+                self._gaps[hour] = (PARTIAL, now)
+            elif hour not in self._hours:
+                self._gaps[hour] = (FAILED, now)
+            return
+
+        if not complete:
+            self._hours[hour] = revision
+            self._gaps[hour] = (PARTIAL, now)
+        elif not revision.offset:
+            self._hours[hour] = None
+            self._gaps[hour] = (EMPTY, now)
+        else:
+            self._hours[hour] = None
+            self._gaps.pop(hour, None)
+
+    def _record_unparsed(self, hour, kept, now):
+        # Record an hour whose file could not be parsed to the end. If none
+        # of it was ingested it stays to be pulled again by refresh (from
+        # where it was last read); if some was, reading it again would
+        # ingest those readings twice, so it is only kept as a gap
+        if kept:
+            self._hours[hour] = None
+            self._gaps[hour] = (PARTIAL, now)
+        elif hour in self._hours:
+            self._gaps[hour] = (PARTIAL, now)
+        else:
+            self._gaps[hour] = (FAILED, now)
+
+    def gaps(self, code=None):
+        """Report of the hours from strt_dte to stp_dte without complete
+        data, as found while pulling.
+
+        :param code : Sensor code to report on, None for the whole Node
+        :type  code : str
+        :return     : Dictionary of {hour: kind} where kind is 'missing' (no
+                      file upstream), 'empty' (file without data), 'partial'
+                      (file still being written, or only partly downloaded
+                      or parsed) or 'failed' (could not be downloaded or
+                      parsed); for a sensor, hours with a file but no
+                      readings from the sensor are reported as 'no data'
+        :rtype      : dict
+        """
+        report = {hour: gap[0] for hour, gap in self._gaps.iteritems()}
+        if code is None:
+            return report
+
+        covered = set()
+        sensor = self.sensor(code)
+        if sensor is not None:
+            epochs = np.unique(sensor.series.epochs // 3600 * 3600)
+            covered = set(epochs.astype('M8[s]').astype(object))
+
+        for hour in self._hours:
+            if hour not in report and hour not in covered:
+                report[hour] = NO_DATA
+        return report
+
+    def _tracked_lines(self, lines, revision, complete, failure,
+                       fetch_stats):
+        # Count the bytes of the lines passed on in revision.offset, and the
+        # lines in fetch_stats. A file that may still be written to stops at
+        # its last complete line. A failed download ends the lines early
+        # (recording the error in failure) so everything read before it is
+        # still ingested
+        n = 0
+        try:
+            for line in lines:
+                if not complete and not line.endswith('\n'):
+                    return
+                revision.offset += len(line)
+                n += 1
+                yield line
+        except FetchError as err:
+            failure.append(err)
+        finally:
+            fetch_stats.lines += n
+
+    def _filter_codes(self, dtypes):
+        # Sensor codes whose lines are kept: the codes asked for, or every
+        # sensor of the Node when pulling all of them
+        if self._codes is None and dtypes is None:
+            return self._sensors.keys()
+        return self._codes
+
+    def _line_filter(self, dtypes=None):
+        # Shared per set of dtypes so what is learned about each sensor
+        # carries over from one hourly file to the next
+        codes = self._filter_codes(dtypes)
+        key = (dtypes and frozenset(dtypes), codes and frozenset(codes))
+        line_filter = self._filters.get(key)
+        if line_filter is None:
+            line_filter = self._filters[key] = LineFilter(dtypes, codes)
+        return line_filter
+
+    def ingest(self, lines, dtypes=None):
+        """Stream the lines of one hourly data file through the tokenizer
+        into the Sensor objects, a bounded batch per sensor at a time. Lines
+        of unwanted sensors or types of data are rejected by their sensor
+        name before they are tokenized (see LineFilter).
+
+        :param lines  : Lines of an hourly data file
+        :type  lines  : iterable
+
+        :param dtypes : Set of the types of data to keep
+        :type  dtypes : set
+
+        :return       : None
+        :rtype        : None
+        """
+        records = tokenize_lines(self._line_filter(dtypes).filter(lines))
+        for batches in batch_records(records):
+            for code, batch in batches.iteritems():
+                sensor = self._sensors.get(code)
+                if sensor is None:
+                    if dtypes is None:
+                        continue
+                    sensor = SENSOR_TYPES.get(code, Sensor)(code)
+                    self._sensors[code] = sensor
+                started = time.time()
+                sensor.add_records(batch)
+                self._stats.add_time('append', time.time() - started)
+                self._stats.add_points(code, len(batch))
+
+    def ingest_packed(self, packed, dtypes=None):
+        """Add the arrays parsed from one hourly data file (see parse_hour)
+        to the Sensor objects.
+
+        :param packed : Dictionary of {code: packed batch} (see
+                        Sensor.pack_records)
+        :type  packed : dict
+
+        :param dtypes : Set of the types of data kept
+        :type  dtypes : set
+
+        :return       : None
+        :rtype        : None
+        """
+        for code, batch in packed.iteritems():
+            sensor = self._sensors.get(code)
+            if sensor is None:
+                if dtypes is None:
+                    continue
+                sensor = SENSOR_TYPES.get(code, Sensor)(code)
+                self._sensors[code] = sensor
+            started = time.time()
+            sensor.add_packed(batch)
+            self._stats.add_time('append', time.time() - started)
+            self._stats.add_points(code, batch[2])
+        
+    def save(self, path):
+        """Save the Node to a snapshot directory: one .npy file per sensor
+        timestamp and value array, plus node.json holding the metadata.
+
+        :param path : Directory to write the snapshot to
+        :type  path : str
+        :return     : None
+        :rtype      : None
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        hours = {}
+        for hour, revision in self._hours.iteritems():
+            if revision is not None:
+                revision = [revision.offset, revision.etag, revision.modified]
+            hours[hour.strftime(HOUR_FORMAT)] = revision
+
+        meta = {'node': self._node,
+                'strt_dte': self._strt_dte,
+                'stp_dte': self._stp_dte,
+                'dtypes': self._dtypes,
+                'codes': self._codes,
+                'hours': hours,
+                'gaps': {hour.strftime(HOUR_FORMAT):
+                         [kind, checked.strftime(CHECKED_FORMAT)]
+                         for hour, (kind, checked) in self._gaps.iteritems()},
+                'sensors': {code: sensor.save(path)
+                            for code, sensor in self.sensors.iteritems()}}
+
+        with open(os.path.join(path, 'node.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r', workers=FETCH_WORKERS, cache=None,
+             missing_expiry=MISSING_EXPIRY, stats_callback=None, source=None,
+             parsers=PARSE_WORKERS):
+        """Open a Node saved with save. The sensor arrays are memory mapped,
+        so opening is near-instant and only the sensors that are used are
+        read from disk.
+
+        :param path      : Directory the snapshot was written to
+        :type  path      : str
+        :param mmap_mode : Memory map mode for np.load (None to read in)
+        :type  mmap_mode : str
+        :return          : The Node
+        :rtype           : Node
+        """
+        with open(os.path.join(path, 'node.json')) as f:
+            meta = json.load(f)
+
+        node = cls.__new__(cls)
+        node._node = str(meta['node'])
+        node._fetcher = Fetcher(workers, cache, source=source)
+        node._parsers = parsers
+        node._lazy = False
+        node._deferred = []
+        node._pending = {}
+        node._filters = {}
+        node._missing_expiry = missing_expiry
+        node._stats = IngestStats(stats_callback)
+        node._strt_dte = str(meta['strt_dte'])
+        node._stp_dte = str(meta['stp_dte'])
+        node._dtypes = meta.get('dtypes')
+        if node._dtypes is not None:
+            node._dtypes = [str(dtype) for dtype in node._dtypes]
+        node._codes = meta.get('codes')
+        if node._codes is not None:
+            node._codes = [str(code) for code in node._codes]
+
+        node._hours = {}
+        for hour, revision in meta.get('hours', {}).iteritems():
+            if revision is not None:
+                offset, etag, modified = revision
+                revision = Revision(offset, etag and str(etag),
+                                    modified and str(modified))
+            node._hours[dt.datetime.strptime(hour, HOUR_FORMAT)] = revision
+
+        node._gaps = {}
+        for hour, (kind, checked) in meta.get('gaps', {}).iteritems():
+            checked = dt.datetime.strptime(checked, CHECKED_FORMAT)
+            node._gaps[dt.datetime.strptime(hour, HOUR_FORMAT)] = (str(kind),
+                                                                   checked)
+
+        node._sensors = {}
+        for code, smeta in meta['sensors'].iteritems():
+            sensor_cls = SENSOR_CLASSES[smeta['class']]
+            node._sensors[str(code)] = sensor_cls.load(path, smeta, mmap_mode)
+        return node
+
+    def between(self, t0=None, t1=None):
+        """Data in the Node from t0 (inclusive) to t1 (exclusive).
+
+        :param t0 : Start of the range, None for the beginning
+        :type  t0 : dt.datetime
+        :param t1 : End of the range, None for the end
+        :type  t1 : dt.datetime
+        :return   : Node whose sensors are views onto this Node's sensors
+                    (see Sensor.between)
+        :rtype    : Node
+        """
+        sensors = self.sensors
+        node = copy.copy(self)
+        # The view pulls and ingests with state of its own, so nothing done
+        # through it changes this Node
+        node._hours = dict(self._hours)
+        node._gaps = dict(self._gaps)
+        node._deferred = []
+        node._pending = {}
+        node._filters = {}
+        node._stats = IngestStats(self._stats.callback).merge(self._stats)
+        node._sensors = {code: sensor.between(t0, t1)
+                         for code, sensor in sensors.iteritems()}
+        return node
+
+    def at(self, t, how='nearest'):
+        """Reading of every sensor in the Node closest to t.
+
+        :param t   : Point in time
+        :type  t   : dt.datetime
+        :param how : 'nearest' for the closest reading, 'asof' for the last
+                     reading at or before t
+        :type  how : str
+        :return    : Dictionary of {code: reading} (see Sensor.at)
+        :rtype     : dict
+        """
+        return {code: sensor.at(t, how)
+                for code, sensor in self.sensors.iteritems()}
+
+    def summary(self):
+        """Running statistics of every sensor in the Node. No data points are
+        touched; the statistics are maintained as data is added.
+
+        :return : Dictionary of {code: {type: RunningStats}}
+        :rtype  : dict
+        """
+        return {code: sensor.summary()
+                for code, sensor in self.sensors.iteritems()}
         
     def get_type_from_line(self, line):
         """Determines the type of data a formatted string contains
@@ -238,20 +882,18 @@ class Node(object):
         
         return dtypes
     
-    def makeURLs(self, strt_dte, stp_dte):
-        """Generate a list of URLs from which to pull AoT data.
+    def makeHours(self, strt_dte, stp_dte):
+        """Generate a list of the hours from which to pull AoT data.
 
-        :param strt_dte : First date from which URLs will be generated
+        :param strt_dte : First date from which hours will be generated
         :type  strt_dte : str
 
-        :param stp_dte  : Last date from which URLs will be generated
+        :param stp_dte  : Last date from which hours will be generated
         :type  stp_dte  : str
 
-        :return         : List of URLs from which to pull data
+        :return         : List of datetimes marking the start of each hour
         :rtype          : list
         """
-        urls = []
-
         strt_dte_data = strt_dte.split('-')
         stp_dte_data = stp_dte.split('-')
 
@@ -262,26 +904,46 @@ class Node(object):
         total_hrs = (diff.days + 1) * 24
         delta = dt.timedelta(hours=1)
 
-        for i in range(total_hrs):
-            if strt.month < 10:
-                mm = '0' + str(strt.month)
-            else:
-                mm = str(strt.month)
-            if strt.day < 10:
-                dd = '0' + str(strt.day)
-            else:
-                dd = str(strt.day)
-            if strt.hour < 10:
-                hh = '0' + str(strt.hour)
-            else:
-                hh = str(strt.hour)
-            yy = str(strt.year)
+        return [strt + i * delta for i in range(total_hrs)]
 
-            url = DATA_URI.format(self.node, mm, dd, yy, hh)
-            urls.append(url)
-            strt += delta
+    def makeURLs(self, strt_dte, stp_dte):
+        """Generate a list of URLs from which to pull AoT data, as named by
+           the Node's Source.
 
-        return urls
+        :param strt_dte : First date from which URLs will be generated
+        :type  strt_dte : str
+
+        :param stp_dte  : Last date from which URLs will be generated
+        :type  stp_dte  : str
+
+        :return         : List of URLs from which to pull data
+        :rtype          : list
+        """
+        source = self._fetcher.source
+        return [source.url(self._node, hour)
+                for hour in self.makeHours(strt_dte, stp_dte)]
+
+    def makeKeys(self, strt_dte, stp_dte):
+        """Generate the (node, hour) cache keys matching makeURLs. Two digit
+           years are taken to be in the 2000s.
+
+        :param strt_dte : First date from which keys will be generated
+        :type  strt_dte : str
+
+        :param stp_dte  : Last date from which keys will be generated
+        :type  stp_dte  : str
+
+        :return         : List of (node, hour) tuples
+        :rtype          : list
+        """
+        keys = []
+
+        for hour in self.makeHours(strt_dte, stp_dte):
+            if hour.year < 100:
+                hour = hour.replace(year=hour.year + 2000)
+            keys.append((self._node, hour))
+
+        return keys
     
 
     def to_datetime(self, s):
@@ -294,8 +956,20 @@ class Node(object):
         """
         return dt.datetime.strptime(s, '%m/%d/%y %H:%M:%S')
     
-    def plot_timeseries(self):
-        """Plot data contained in all the sensors of the AoT node."""
+    def plot_timeseries(self, path=None, show=True, downsample=True):
+        """Plot data contained in all the sensors of the AoT node.
+
+        :param path       : File the figure is saved to, <node>.png by default
+        :type  path       : str
+        :param show       : False to close the figure once saved instead of
+                            showing it, e.g. when rendering without a display
+        :type  show       : bool
+        :param downsample : False to draw every reading of long series rather
+                            than only those visible at the subplot's width
+        :type  downsample : bool
+        :return           : None
+        :rtype            : None
+        """
         fig = plt.figure(figsize=(25, 15))
         figtitle = "AoT Node: {}\n{} - {}"
         figtitle = figtitle.format(self._node, self._strt_dte, self._stp_dte)
@@ -309,18 +983,21 @@ class Node(object):
         i = 0
         j = 0
         k = 0
-        sensors = self._sensors.iteritems()
+        sensors = self.sensors.iteritems()
         for sensor in sensors:
             sensor = sensor[1]
             if k >= l:
                 k = 0
                 j+=1
             sub_plot = plt.subplot2grid(grid, (k, j), rowspan=1, colspan=1)
-            sensor.plot_timeseries(sub_plot)
+            sensor.plot_timeseries(sub_plot, downsample)
             plt.subplots_adjust(wspace=0.5, hspace=0.5)
             i+=1
             k+=1
             
         fig.autofmt_xdate()
-        fig.savefig(self._node + ".png")
-        plt.show()
+        fig.savefig(path or self._node + ".png")
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
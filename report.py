@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from constants import GRID_SENSOR, PARSE_WORKERS
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+# Figures rendered for every Node, with the names of their files
+FIGURES = OrderedDict([('timeseries', '{node}.png'),
+                       ('grid', '{node}_IR_Grid.png')])
+
+# File in the report directory recording what every figure was drawn from
+MANIFEST = 'report.json'
+
+GRID_CODE = GRID_SENSOR.split('.', 1)[0]
+
+# AoT object being reported on, inherited by the worker processes
+_aot = None
+
+
+def render(aot, path, figures=None, processes=PARSE_WORKERS, force=False):
+    """Render figures of every Node of an AoT object into a directory,
+       without a display, in a pool of processes. A figure whose data has
+       not changed since it was last rendered (see digest) is left as it
+       is, so rerunning a report only redraws what changed.
+
+    :param aot       : Nodes to report on
+    :type  aot       : AoT
+    :param path      : Directory the figures are written to
+    :type  path      : str
+    :param figures   : Dictionary of {figure: file name template}, the
+                       template formatted with node=name of the Node;
+                       FIGURES by default, or a list of some of its keys
+    :type  figures   : dict
+    :param processes : Number of rendering processes, 0 to render in this
+                       process
+    :type  processes : int
+    :param force     : True to redraw every figure
+    :type  force     : bool
+    :return          : Dictionary of {file name: status}, the status being
+                       'rendered', 'unchanged', 'empty' (no data to draw) or
+                       'failed'
+    :rtype           : OrderedDict
+    """
+    if figures is None:
+        figures = FIGURES
+    elif not isinstance(figures, dict):
+        figures = OrderedDict((kind, FIGURES[kind]) for kind in figures)
+
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    manifest_path = os.path.join(path, MANIFEST)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    tasks = []
+    for name in sorted(aot.nodes):
+        # Lazy Nodes pull here, once, rather than in every process
+        aot.nodes[name].sensors
+        for kind, template in figures.iteritems():
+            fname = template.format(node=name)
+            previous = None if force else manifest.get(fname)
+            tasks.append((name, kind, os.path.join(path, fname), previous))
+
+    if processes:
+        pool = multiprocessing.Pool(min(processes, len(tasks)) or 1,
+                                    _init_worker, (aot,))
+        try:
+            results = pool.map(_render_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        # Draw without a display here too, then give back the backend the
+        # caller was using
+        backend = plt.get_backend()
+        plt.switch_backend('Agg')
+        try:
+            results = [_render(aot, task) for task in tasks]
+        finally:
+            plt.switch_backend(backend)
+
+    statuses = OrderedDict()
+    for (name, kind, fname, previous), (status, key) in zip(tasks, results):
+        fname = os.path.basename(fname)
+        statuses[fname] = status
+        if status == 'failed':
+            manifest.pop(fname, None)
+        else:
+            manifest[fname] = key
+
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.rename(manifest_path + '.tmp', manifest_path)
+    return statuses
+
+
+def digest(node, kind):
+    """Fingerprint of the data a figure of a Node is drawn from: its name and
+       dates, and the name, types and readings of the sensors in it.
+
+    :param node : The Node
+    :type  node : Node
+    :param kind : Figure (see FIGURES)
+    :type  kind : str
+    :return     : Hex digest, or None if there is no data to draw
+    :rtype      : str
+    """
+    sensors = _sensors(node, kind)
+    if not any(len(sensor.series) for sensor in sensors):
+        return None
+
+    h = hashlib.sha1()
+    h.update(repr((kind, node.node, node.strt_dte, node.stp_dte)))
+    for sensor in sensors:
+        h.update(repr((sensor.code, type(sensor).__name__,
+                       sensor.sensor_name, sensor.dtype)))
+        for attr in sorted(sensor.CHANNELS.itervalues()):
+            series = getattr(sensor, attr)
+            h.update(np.ascontiguousarray(series.epochs))
+            h.update(np.ascontiguousarray(series.values))
+    return h.hexdigest()
+
+
+def _sensors(node, kind):
+    # Sensors drawn in a figure, in a fixed order
+    if kind == 'grid':
+        grid = node.sensors.get(GRID_CODE)
+        return [grid] if grid is not None else []
+    return [node.sensors[code] for code in sorted(node.sensors)]
+
+
+def _init_worker(aot):
+    # The AoT object is handed over when the process is forked, not pickled
+    global _aot
+    _aot = aot
+    plt.switch_backend('Agg')
+
+
+def _render_task(task):
+    return _render(_aot, task)
+
+
+def _render(aot, task):
+    # Draw one figure unless its data is the same as last time. Returns
+    # (status, digest)
+    name, kind, fname, previous = task
+    node = aot.nodes[name]
+    key = digest(node, kind)
+    if key is None:
+        return 'empty', None
+    if key == previous and os.path.isfile(fname):
+        return 'unchanged', key
+
+    try:
+        if kind == 'grid':
+            node.sensors[GRID_CODE].view_grid(fname, show=False)
+        else:
+            node.plot_timeseries(fname, show=False)
+    except Exception as err:
+        print "Failed to render: {} ({})".format(fname, err)
+        plt.close('all')
+        return 'failed', None
+    return 'rendered', key
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime as dt
+import numpy as np
+
+
+def to_seconds(window):
+    """Convert a window length to whole seconds
+
+    :param window : Window length as a timedelta or a number of seconds
+    :type  window : dt.timedelta
+    :return       : Number of seconds in the window
+    :rtype        : int
+    """
+    if isinstance(window, dt.timedelta):
+        return window.days * 86400 + window.seconds
+    return int(window)
+
+
+def resample(epochs, values, window, origin=None):
+    """Summarize a timeseries per time bucket in a single vectorized pass.
+       Buckets are window seconds wide and start at origin; only buckets
+       containing data are returned.
+
+    :param epochs : Timestamps in seconds since the epoch
+    :type  epochs : np.ndarray
+    :param values : Values (or frames of values) at each timestamp
+    :type  values : np.ndarray
+    :param window : Width of the buckets
+    :type  window : dt.timedelta
+    :param origin : Start of the first bucket in seconds since the epoch,
+                    defaults to the first timestamp
+    :type  origin : int
+    :return       : Per-bucket mean, min, max, count, std and last values
+    :rtype        : Aggregates
+    """
+    window = to_seconds(window)
+    epochs = np.asarray(epochs)
+    values = np.asarray(values, dtype=np.float64)
+    if window <= 0:
+        raise ValueError("window must be positive")
+
+    if len(epochs) and (np.diff(epochs) < 0).any():
+        order = np.argsort(epochs, kind='mergesort')
+        epochs = epochs[order]
+        values = values[order]
+
+    if origin is None:
+        origin = int(epochs[0]) if len(epochs) else 0
+
+    bins = (epochs - origin) // window
+    return _combine(window, origin, bins, values)
+
+
+def resample_many(epochs, values, windows, origin=None):
+    """Summarize a timeseries at several resolutions from one scan of the
+       data. The finest window is computed from the raw values and every
+       window that is a multiple of it is rolled up from those buckets.
+
+    :param epochs  : Timestamps in seconds since the epoch
+    :type  epochs  : np.ndarray
+    :param values  : Values (or frames of values) at each timestamp
+    :type  values  : np.ndarray
+    :param windows : Widths of the buckets
+    :type  windows : list
+    :param origin  : Start of the first bucket in seconds since the epoch,
+                     defaults to the first timestamp
+    :type  origin  : int
+    :return        : Aggregates for each window, in the order given
+    :rtype         : list
+    """
+    seconds = [to_seconds(window) for window in windows]
+    finest = min(seconds)
+    base = resample(epochs, values, finest, origin)
+
+    aggs = []
+    for window in seconds:
+        if window == finest:
+            aggs.append(base)
+        elif window % finest == 0:
+            aggs.append(base.rollup(window))
+        else:
+            aggs.append(resample(epochs, values, window, base.origin))
+    return aggs
+
+
+def envelope(epochs, values, n):
+    """Pick the points of a timeseries that keep its shape when drawn n
+       pixels wide: the first, last, lowest and highest point of each of n
+       equal time buckets (for frames, of every column). A line through
+       them covers the same pixels as the full series, peaks included.
+
+    :param epochs : Timestamps in seconds since the epoch, in order
+    :type  epochs : np.ndarray
+    :param values : Values (or frames of values) at each timestamp
+    :type  values : np.ndarray
+    :param n      : Number of buckets, about the width of the plot in pixels
+    :type  n      : int
+    :return       : Sorted indices of the points to keep
+    :rtype        : np.ndarray
+    """
+    epochs = np.asarray(epochs)
+    values = np.asarray(values, dtype=np.float64)
+    if len(epochs) <= 4 * n:
+        return np.arange(len(epochs))
+
+    span = int(epochs[-1]) - int(epochs[0]) + 1
+    bins = (epochs.astype(np.int64) - int(epochs[0])) * n // span
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    ends = np.concatenate((starts[1:], [len(bins)]))
+    runs = np.repeat(np.arange(len(starts)), ends - starts)
+
+    keep = [starts, ends - 1]
+    for column in values.reshape(len(values), -1).T:
+        for extreme in (np.fmin, np.fmax):
+            # First point of each bucket equal to its extreme; all-NaN
+            # buckets have none
+            hits = np.flatnonzero(column == extreme.reduceat(column,
+                                                             starts)[runs])
+            first = np.concatenate(([True], np.diff(runs[hits]) != 0))
+            keep.append(hits[first])
+    return np.unique(np.concatenate(keep))
+
+
+def _combine(window, origin, bins, means, counts=None, m2=None, mins=None,
+             maxs=None, lasts=None):
+    # Merge runs of equal (sorted) bins. Raw values are partials with a
+    # count of one and no spread; rollups pass per-bucket partials.
+    shape = means.shape[1:]
+    if not len(bins):
+        empty = np.empty((0,) + shape)
+        return Aggregates(window, origin, np.empty(0, dtype=np.int64),
+                          np.empty(0, dtype=np.int64), empty, empty, empty,
+                          empty, empty)
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+    ends = np.concatenate((starts[1:], [len(bins)]))
+
+    if counts is None:
+        count = ends - starts
+        total = np.add.reduceat(means, starts, axis=0)
+    else:
+        count = np.add.reduceat(counts, starts)
+        total = np.add.reduceat(means * _column(counts, shape), starts,
+                                axis=0)
+    mean = total / _column(count, shape)
+
+    dev = means - np.repeat(mean, ends - starts, axis=0)
+    if counts is None:
+        spread = np.add.reduceat(dev * dev, starts, axis=0)
+    else:
+        spread = np.add.reduceat(m2 + _column(counts, shape) * dev * dev,
+                                 starts, axis=0)
+
+    if mins is None:
+        mins = maxs = lasts = means
+    mini = np.minimum.reduceat(mins, starts, axis=0)
+    maxi = np.maximum.reduceat(maxs, starts, axis=0)
+    last = lasts[ends - 1]
+
+    epochs = origin + bins[starts] * window
+    return Aggregates(window, origin, epochs, count, mean, spread, mini,
+                      maxi, last)
+
+
+def _column(a, shape):
+    # Broadcast a per-bucket array against per-bucket frames
+    return a.reshape((-1,) + (1,) * len(shape))
+
+
+class Aggregates(object):
+    """Aggregates class for per-bucket summaries of a timeseries.
+
+    Aggregates are mergeable: rollup() combines them into coarser buckets
+    without going back to the raw data.
+
+    INSTANCE VARIABLES
+        window : int   : Width of the buckets in seconds
+        origin : int   : Start of the first possible bucket (epoch seconds)
+        epochs : array : int64 start of each bucket (epoch seconds)
+        times  : array : datetime64 start of each bucket
+        count  : array : Number of readings in each bucket
+        mean   : array : Mean of each bucket
+        min    : array : Minimum of each bucket
+        max    : array : Maximum of each bucket
+        std    : array : Population standard deviation of each bucket
+        last   : array : Last reading in each bucket
+    """
+    def __init__(self, window, origin, epochs, count, mean, m2, mini, maxi,
+                 last):
+        self._window = window
+        self._origin = origin
+        self._epochs = epochs
+        self._count = count
+        self._mean = mean
+        self._m2 = m2
+        self._min = mini
+        self._max = maxi
+        self._last = last
+
+    def __len__(self):
+        return len(self._epochs)
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def origin(self):
+        return self._origin
+
+    @property
+    def epochs(self):
+        return self._epochs
+
+    @property
+    def times(self):
+        return self._epochs.view('M8[s]')
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / _column(self._count, self._mean.shape[1:]))
+
+    @property
+    def last(self):
+        return self._last
+
+    def rollup(self, window):
+        """Combine the buckets into coarser buckets with the same origin.
+
+        :param window : Width of the coarser buckets; must be a multiple of
+                        the current window
+        :type  window : dt.timedelta
+        :return       : Aggregates of the coarser buckets
+        :rtype        : Aggregates
+        """
+        window = to_seconds(window)
+        if window % self._window:
+            raise ValueError("window must be a multiple of " +
+                             str(self._window) + " seconds")
+
+        bins = (self._epochs - self._origin) // window
+        return _combine(window, self._origin, bins, self._mean, self._count,
+                        self._m2, self._min, self._max, self._last)
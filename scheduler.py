@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import multiprocessing
+from collections import deque
+from multiprocessing.pool import ThreadPool
+from constants import FETCH_WORKERS, PARSE_WORKERS
+from fetch import FetchError
+
+
+class Job(object):
+    """Job class for one hourly data file going through a Scheduler: it is
+    downloaded on a download thread, then parsed in a parse process.
+
+    INSTANCE VARIABLES
+        url      : str        : URL of the hourly data file
+        key      : tuple      : (node, hour) cache key of the file
+        stats    : FetchStats : Measurements of the download
+        complete : bool       : False if the file may still be written to
+        missing  : bool       : True if the file is missing upstream
+        error    : FetchError : Error that cut the download short, if any
+        size     : int        : Number of bytes of complete lines parsed
+    """
+    def __init__(self, url, key, stats, complete):
+        self.url = url
+        self.key = key
+        self.stats = stats
+        self.missing = False
+        self.error = None
+        self.complete = complete
+        self.size = 0
+        self._fetched = threading.Event()
+        self._parsed = None
+        self._exc = None
+
+    def get(self):
+        """Wait for the file to be downloaded and parsed.
+
+        :return : Result of the parse function, or None if there was nothing
+                  to parse
+        :rtype  : object
+        """
+        self._fetched.wait()
+        if self._exc is not None:
+            raise self._exc
+        if self._parsed is None:
+            return None
+        return self._parsed.get()
+
+
+class _Done(object):
+    # Stand-in for an AsyncResult when parsing ran on the download thread
+    def __init__(self, value):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+
+class Scheduler(object):
+    """Scheduler class for pulling hourly files of many Nodes at once while
+    capping the load on the data host and on the CPU: every Node shares
+    the same download threads and parse processes.
+
+    Files are downloaded whole on one of downloads threads (through the
+    Fetcher of their Node, so its cache and retries apply) and parsed in
+    one of parsers processes, which send back compact NumPy arrays rather
+    than lists of tuples. At most pending files are held (downloaded,
+    parsed or waiting to be ingested) at once across all Nodes, so memory
+    stays bounded however many Nodes are pulled.
+
+    INSTANCE VARIABLES
+        downloads : int : Maximum number of downloads in flight
+        parsers   : int : Number of parse processes, 0 to parse on the
+                          download threads
+        pending   : int : Maximum number of files held at once
+    """
+    def __init__(self, downloads=FETCH_WORKERS, parsers=PARSE_WORKERS,
+                 pending=None):
+        self._downloads = max(1, int(downloads))
+        self._parsers = max(0, int(parsers))
+        if pending is None:
+            pending = 2 * (self._downloads + self._parsers)
+        self._pending = max(1, int(pending))
+        self._slots = threading.Semaphore(self._pending)
+        # Fork the parse processes before starting any thread
+        self._processes = None
+        if self._parsers:
+            self._processes = multiprocessing.Pool(self._parsers)
+        self._threads = ThreadPool(self._downloads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def downloads(self):
+        return self._downloads
+
+    @property
+    def parsers(self):
+        return self._parsers
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def run(self, fetcher, files, parse, args=()):
+        """Download and parse hourly files, yielding them in the given
+           (chronological) order. Each Job must be dealt with before
+           advancing to the next, since its slot is only freed then.
+
+        :param fetcher : Fetcher downloading the files
+        :type  fetcher : Fetcher
+        :param files   : (url, key, stats, complete) tuples; files that are
+                         not complete (still being written) are cut at
+                         their last complete line
+        :type  files   : iterable
+        :param parse   : Module level function called as
+                         parse(data, *args) on the bytes of each file
+        :type  parse   : function
+        :param args    : Further arguments of parse
+        :type  args    : tuple
+        :return        : Generator of finished Jobs
+        :rtype         : generator
+        """
+        jobs = deque()
+        try:
+            for url, key, stats, complete in files:
+                # A Node holding files may only take a free slot; one that
+                # holds none waits for a slot, so Nodes never block each
+                # other forever
+                while jobs and not self._slots.acquire(False):
+                    try:
+                        yield jobs.popleft()
+                    finally:
+                        self._slots.release()
+                if not jobs:
+                    self._slots.acquire()
+
+                job = Job(url, key, stats, complete)
+                jobs.append(job)
+                self._threads.apply_async(self._fetch,
+                                          (fetcher, job, parse, args))
+
+            while jobs:
+                try:
+                    yield jobs.popleft()
+                finally:
+                    self._slots.release()
+        finally:
+            # Free the slots of the Jobs never handed out, e.g. when the
+            # consumer stopped early
+            for job in jobs:
+                self._slots.release()
+
+    def close(self):
+        """Stop the download threads and parse processes.
+
+        :return : None
+        :rtype  : None
+        """
+        self._threads.close()
+        self._threads.join()
+        if self._processes is not None:
+            self._processes.close()
+            self._processes.join()
+
+    def _fetch(self, fetcher, job, parse, args):
+        # Download thread: read the whole file, then hand it to a parse
+        # process
+        try:
+            parts = []
+            try:
+                chunks = fetcher.open(job.url, job.key, job.stats)
+                if chunks is None:
+                    job.missing = True
+                    return
+                for chunk in chunks:
+                    parts.append(chunk)
+            except FetchError as err:
+                job.error = err
+
+            data = ''.join(parts)
+            if not job.complete or job.error is not None:
+                data = data[:data.rfind('\n') + 1]
+            job.size = len(data)
+            if not data:
+                return
+            if self._processes is None:
+                job._parsed = _Done(parse(data, *args))
+            else:
+                job._parsed = self._processes.apply_async(parse,
+                                                          (data,) + args)
+        except Exception as err:
+            job._exc = err
+        finally:
+            job._fetched.set()
@@ -1,11 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import os
+import copy
 import urllib2
 import datetime as dt
 from ConfigParser import ConfigParser
-from constants import SENSOR_CODES, GRID_SENSOR, DATA_URI
+from constants import SENSOR_CODES, GRID_SENSOR, GRID_SHAPE, DATA_URI
+from constants import DOWNSAMPLE_THRESHOLD
+from series import Series
+from ingest import tokenize, parse_timestamp, parse_timestamps
+from resample import to_seconds, resample_many, envelope
 import numpy as np
 from matplotlib.backends.backend_pdf import PdfPages
+import matplotlib.animation as animation
 import matplotlib as mtplt
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
@@ -13,30 +20,75 @@ import matplotlib.cm as cmaps
 import scipy.stats as stats
 
 
+def plot_index(ax, series, values, downsample=True):
+    """Indices of the readings of a series worth drawing on a subplot.
+       Series longer than DOWNSAMPLE_THRESHOLD are cut down to the first,
+       last, lowest and highest reading per pixel column (see envelope),
+       which draws the same picture from a fraction of the points.
+
+    :param ax         : Subplot the series is drawn on
+    :type  ax         : plt.Axes
+    :param series     : Timestamps of the readings
+    :type  series     : Series
+    :param values     : Readings (or frames of readings) to draw
+    :type  values     : np.ndarray
+    :param downsample : False to draw every reading
+    :type  downsample : bool
+    :return           : Indices (or slice) of the readings to draw
+    :rtype            : np.ndarray
+    """
+    if not downsample or len(series) <= DOWNSAMPLE_THRESHOLD:
+        return slice(None)
+    return envelope(series.epochs, values, max(1, int(ax.bbox.width)))
+
+
 class Sensor(object):
     """Sensor class for encapsulating data in AoT sensors.
 
     INSTANCE VARIABLES
-        code        :  str   : Model of the AoT sensor
-        data        :  list  : list of data points (datetime, float) tuples
-        sensor_name :  str   : Full name of sensor
-        dtype       :  list  : list of types of data (type, units) tuples
-        context     :  str   : Additional sensor info
+        code        :  str    : Model of the AoT sensor
+        series      :  Series : Columnar storage of the data points
+        times       :  array  : datetime64 timestamps of the data points
+        values      :  array  : float64 values of the data points
+        data        :  list   : list of data points (datetime, float) tuples
+        sensor_name :  str    : Full name of sensor
+        dtype       :  list   : list of types of data (type, units) tuples
+        context     :  str    : Additional sensor info
     """
+    # Series attributes saved by save(), keyed by channel name
+    CHANNELS = {'values': '_series'}
+
     def __init__(self, code):
         self._code = code
-        self._data = []
+        self._series = Series()
         self._sensor_name = None
         self._dtype = []
         self._context = None
+        self._resampled = {}
 
     @property
     def code(self):
         return self._code
         
+    @property
+    def series(self):
+        return self._series
+
+    @property
+    def times(self):
+        return self._series.times
+
+    @property
+    def values(self):
+        return self._series.values
+
     @property
     def data(self):
-        return self._data
+        return self._series.tuples()
+
+    @property
+    def stats(self):
+        return self._series.stats
     
     @property
     def sensor_name(self):
@@ -58,41 +110,234 @@ class Sensor(object):
         :return     : None
         :rtype      : None
         """
-        arr = line.split(',')
-        name = arr[0]
-        timestamp = dt.datetime.strptime(arr[1], '%m/%d/%y %H:%M:%S')
-        dtypes = []
-        self._sensor_name = name
+        code, name, stamp, data = tokenize(line)
+        timestamp = parse_timestamp(stamp)
+        self._set_info(name, data)
 
-        data = arr[2:]
         for datum in data:
-            info = datum.split(';')
-            type = info[0]
-            unit = info[2]
-            val = (timestamp, float(info[1]))
-            context = info[3]
-            
-            dtype = (type, unit)
-            dtypes.append(dtype)
-            
-            self._data.append(val)
-            self._dtype = dtypes
-            self._context = context
+            self._series.append(timestamp, datum[1])
+
+    def add_points(self, lines):
+        """Add the data points from a batch of formatted strings (typically
+           all of a Sensor's lines from one hourly file) to the Sensor.
+
+        :param lines : Formatted lines containing data to be added
+        :type  lines : list
+        :return      : None
+        :rtype       : None
+        """
+        self.add_records([tokenize(line) for line in lines])
+
+    def add_records(self, records):
+        """Add a batch of tokenized lines (see ingest.tokenize) to the
+           Sensor. The timestamps are parsed together in one vectorized step.
+
+        :param records : (code, name, timestamp, data) tuples
+        :type  records : list
+        :return        : None
+        :rtype         : None
+        """
+        if not records:
+            return
+        self.add_packed(self.pack_records(records))
+
+    @classmethod
+    def pack_records(cls, records):
+        """Convert a batch of tokenized lines into the arrays stored by
+           this class of sensor, without needing a Sensor object. Packed
+           batches are compact to pickle, so they can be built in another
+           process and added with add_packed.
+
+        :param records : (code, name, timestamp, data) tuples, not empty
+        :type  records : list
+        :return        : (name, data, count, channels) tuple: the sensor name
+                         and data of the last record, the number of records
+                         and a list of (attribute, epochs, values) tuples
+        :rtype         : tuple
+        """
+        stamps = []
+        vals = []
+        for code, name, stamp, data in records:
+            for datum in data:
+                stamps.append(stamp)
+                vals.append(datum[1])
+
+        channels = [('_series', parse_timestamps(stamps),
+                     np.array(vals, dtype=np.float64))]
+        return records[-1][1], records[-1][3], len(records), channels
+
+    def add_packed(self, packed):
+        """Add a batch of records converted by pack_records.
+
+        :param packed : (name, data, count, channels) tuple
+        :type  packed : tuple
+        :return       : None
+        :rtype        : None
+        """
+        name, data, count, channels = packed
+        self._set_info(name, data)
+        for attr, epochs, values in channels:
+            getattr(self, attr).extend(epochs, values)
+
+    def _set_info(self, name, data):
+        self._sensor_name = name
+        if data:
+            self._dtype = [(datum[0], datum[2]) for datum in data]
+            self._context = data[-1][3]
+
+    def save(self, path):
+        """Write the data in the Sensor to .npy files (one per timestamp
+           and value array) in the directory path.
+
+        :param path : Directory to write to
+        :type  path : str
+        :return     : Metadata needed by load
+        :rtype      : dict
+        """
+        meta = {'class': type(self).__name__,
+                'code': self._code,
+                'sensor_name': self._sensor_name,
+                'dtype': self._dtype,
+                'context': self._context,
+                'channels': {}}
+
+        for name, attr in self.CHANNELS.iteritems():
+            prefix = os.path.join(path, self._code + '.' + name)
+            meta['channels'][name] = getattr(self, attr).save(prefix)
+        return meta
+
+    @classmethod
+    def load(cls, path, meta, mmap_mode='r'):
+        """Open a Sensor written by save, memory mapping its arrays.
+
+        :param path      : Directory the Sensor was written to
+        :type  path      : str
+        :param meta      : Metadata returned by save
+        :type  meta      : dict
+        :param mmap_mode : Memory map mode for np.load (None to read in)
+        :type  mmap_mode : str
+        :return          : The Sensor
+        :rtype           : Sensor
+        """
+        sensor = cls(str(meta['code']))
+        if meta['sensor_name'] is not None:
+            sensor._sensor_name = str(meta['sensor_name'])
+        sensor._dtype = [(str(t), str(u)) for t, u in meta['dtype']]
+        context = meta['context']
+        if isinstance(context, list):
+            sensor._context = [str(c) for c in context]
+        elif context is not None:
+            sensor._context = str(context)
+
+        for name, stats in meta['channels'].iteritems():
+            prefix = os.path.join(path, sensor._code + '.' + name)
+            series = Series.load(prefix, stats, mmap_mode)
+            setattr(sensor, cls.CHANNELS[name], series)
+        return sensor
+
+    def between(self, t0=None, t1=None):
+        """Data in the Sensor from t0 (inclusive) to t1 (exclusive), found
+           by binary search over the timestamps.
+
+        :param t0 : Start of the range, None for the beginning
+        :type  t0 : dt.datetime
+        :param t1 : End of the range, None for the end
+        :type  t1 : dt.datetime
+        :return   : Sensor of the same type whose arrays are views onto this
+                    Sensor's arrays
+        :rtype    : Sensor
+        """
+        sensor = copy.copy(self)
+        for attr in self.CHANNELS.itervalues():
+            setattr(sensor, attr, getattr(self, attr).between(t0, t1))
+        sensor._resampled = {}
+        return sensor
+
+    def at(self, t, how='nearest'):
+        """Reading of the Sensor closest to t.
+
+        :param t   : Point in time
+        :type  t   : dt.datetime
+        :param how : 'nearest' for the closest reading, 'asof' for the last
+                     reading at or before t
+        :type  how : str
+        :return    : (datetime64, float) tuple, or None if there is no reading
+        :rtype     : tuple
+        """
+        i = self._series.index(t, how)
+        if i is None:
+            return None
+        return self.times[i], self.values[i]
+
+    def summary(self):
+        """Running statistics of the Sensor, keyed by type of data. These
+           are kept up to date as data is added, so this is O(1).
+
+        :return : Dictionary of {type: RunningStats}
+        :rtype  : dict
+        """
+        if not self._dtype:
+            return {}
+        return {self._dtype[0][0]: self._series.stats}
+
+    def resample(self, window, origin=None):
+        """Summarize the data in the Sensor per time bucket (mean, min, max,
+           count, std and last value).
+
+        :param window : Width of the buckets
+        :type  window : dt.timedelta
+        :param origin : Start of the first bucket in seconds since the epoch,
+                        defaults to the first timestamp
+        :type  origin : int
+        :return       : Per-bucket aggregates
+        :rtype        : Aggregates
+        """
+        return self.resample_many([window], origin)[0]
+
+    def resample_many(self, windows, origin=None):
+        """Summarize the data in the Sensor at several resolutions from one
+           scan of the data. Results are reused until more data is added.
+
+        :param windows : Widths of the buckets
+        :type  windows : list
+        :param origin  : Start of the first bucket in seconds since the
+                         epoch, defaults to the first timestamp
+        :type  origin  : int
+        :return        : Aggregates for each window, in the order given
+        :rtype         : list
+        """
+        return self._resample('values', self._series, windows, origin)
+
+    def _resample(self, channel, series, windows, origin):
+        n = len(series)
+        seconds = [to_seconds(window) for window in windows]
+        keys = [(channel, window, origin) for window in seconds]
+
+        stale = [key for key in keys
+                 if self._resampled.get(key, (None,))[0] != n]
+        if stale:
+            aggs = resample_many(series.epochs, series.values,
+                                 [key[1] for key in stale], origin)
+            for key, agg in zip(stale, aggs):
+                self._resampled[key] = (n, agg)
+
+        return [self._resampled[key][1] for key in keys]
     
-    def plot_timeseries(self, subplot=None):
+    def plot_timeseries(self, subplot=None, downsample=True):
         """Create a timeseries plot from the data in the Sensor.
 
-        :param subplot : None
-        :type  subplot : plt.subplot
-        :return        : Subplot of timeseries
-        :rtype         : plt.subplot
+        :param subplot    : None
+        :type  subplot    : plt.subplot
+        :param downsample : False to draw every reading of long series
+                            (see plot_index)
+        :type  downsample : bool
+        :return           : Subplot of timeseries
+        :rtype            : plt.subplot
         """
         if subplot is None:
-            data = self._data
             dtype = self._dtype
             name = self._sensor_name
 
-            x, y = zip(*data)
             type0, units = zip(*dtype)
             type0 = type0[0]
             units = units[0]
@@ -105,6 +350,8 @@ class Sensor(object):
 
             fig = plt.figure() 
             ax1 = plt.subplot()
+            keep = plot_index(ax1, self._series, self.values, downsample)
+            x, y = self.times[keep], self.values[keep]
             ax1.plot(x, y, 'r-', label=type)
             ax1.set_xlabel(xlab)
             ax1.set_ylabel(ylab)
@@ -112,11 +359,9 @@ class Sensor(object):
 
             return ax1
         else:
-            data = self._data
             dtype = self._dtype
             name = self._sensor_name
 
-            x, y = zip(*data)
             type0, units = zip(*dtype)
             type0 = type0[0]
             units = units[0]
@@ -126,6 +371,8 @@ class Sensor(object):
             ylab = ylab_tmpl.format(type0, units)
             title_tmpl = '{}: \n{}'
             title = title_tmpl.format(name, type0)
+            keep = plot_index(subplot, self._series, self.values, downsample)
+            x, y = self.times[keep], self.values[keep]
             subplot.plot(x, y, 'r-', label=type0)
             subplot.set_xlabel(xlab)
             subplot.set_ylabel(ylab)
@@ -136,16 +383,74 @@ class DualSensor(Sensor):
     """Dual Sensor subclass for AoT sensors that collect two types of data:
 
     ADDITIONAL VARIABLES
+        series2     :  Series : Columnar storage of the second type of data
+        values2     :  array  : float64 values of the second type of data
         data2       :  list   : Second list of data points (datetime, float) tuples
     """
+    CHANNELS = dict(Sensor.CHANNELS, values2='_series2')
 
     def __init__(self, code):
         super(DualSensor, self).__init__(code)
-        self._data2 = []
+        self._series2 = Series()
+
+    @property
+    def series2(self):
+        return self._series2
+
+    @property
+    def values2(self):
+        return self._series2.values
     
     @property
     def data2(self):
-        return self._data2
+        return self._series2.tuples()
+
+    @property
+    def stats2(self):
+        return self._series2.stats
+
+    def at(self, t, how='nearest'):
+        """Readings of the DualSensor closest to t (see Sensor.at).
+
+        :param t   : Point in time
+        :type  t   : dt.datetime
+        :param how : 'nearest' or 'asof'
+        :type  how : str
+        :return    : (datetime64, float, float) tuple, or None if there is
+                     no reading
+        :rtype     : tuple
+        """
+        reading = super(DualSensor, self).at(t, how)
+        j = self._series2.index(t, how)
+        if reading is None or j is None:
+            return reading
+        return reading + (self.values2[j],)
+
+    def summary(self):
+        """Running statistics of both types of data in the DualSensor,
+           keyed by type of data.
+
+        :return : Dictionary of {type: RunningStats}
+        :rtype  : dict
+        """
+        summary = super(DualSensor, self).summary()
+        if len(self._dtype) > 1:
+            summary[self._dtype[1][0]] = self._series2.stats
+        return summary
+
+    def resample2(self, window, origin=None):
+        """Summarize the second type of data in the DualSensor per time
+           bucket (see Sensor.resample).
+
+        :param window : Width of the buckets
+        :type  window : dt.timedelta
+        :param origin : Start of the first bucket in seconds since the epoch,
+                        defaults to the first timestamp
+        :type  origin : int
+        :return       : Per-bucket aggregates
+        :rtype        : Aggregates
+        """
+        return self._resample('values2', self._series2, [window], origin)[0]
     
     def add_point(self, line):
         """Add one data point to the DualSensor from a formatted string.
@@ -155,50 +460,59 @@ class DualSensor(Sensor):
         :return     : None
         :rtype      : None
         """
-        arr = line.split(',')
-        name = arr[0]
-        timestamp = dt.datetime.strptime(arr[1], '%m/%d/%y %H:%M:%S')
-        dtypes = []
-        self._sensor_name = name
+        code, name, stamp, data = tokenize(line)
+        timestamp = parse_timestamp(stamp)
+        self._set_info(name, data)
 
-        data = arr[2:]
         i = 0
         for datum in data:
-            info = datum.split(';')
-            type = info[0]
-            unit = info[2]
-            val = (timestamp, float(info[1]))
-            context = info[3]
-            
-            dtype = (type, unit)
-            dtypes.append(dtype)
-            
-            self._dtype = dtypes
-            self._context = context
             if i == 0:
-                self._data.append(val)
+                self._series.append(timestamp, datum[1])
             else:
-                self._data2.append(val)
+                self._series2.append(timestamp, datum[1])
             i+=1
+
+    @classmethod
+    def pack_records(cls, records):
+        """Convert a batch of tokenized lines into the arrays of both
+           channels of a DualSensor (see Sensor.pack_records).
+
+        :param records : (code, name, timestamp, data) tuples, not empty
+        :type  records : list
+        :return        : (name, data, count, channels) tuple
+        :rtype         : tuple
+        """
+        stamps = [[], []]
+        vals = [[], []]
+        for code, name, stamp, data in records:
+            i = 0
+            for datum in data:
+                stamps[min(i, 1)].append(stamp)
+                vals[min(i, 1)].append(datum[1])
+                i+=1
+
+        channels = [('_series', parse_timestamps(stamps[0]),
+                     np.array(vals[0], dtype=np.float64)),
+                    ('_series2', parse_timestamps(stamps[1]),
+                     np.array(vals[1], dtype=np.float64))]
+        return records[-1][1], records[-1][3], len(records), channels
     
-    def plot_timeseries(self, subplot=None):
+    def plot_timeseries(self, subplot=None, downsample=True):
         """Create a timeseries plot from the data in the DualSensor.
 
-        :param subplot : None
-        :type  subplot : plt.subplot
+        :param subplot    : None
+        :type  subplot    : plt.subplot
+        :param downsample : False to draw every reading of long series
+                            (see plot_index)
+        :type  downsample : bool
         
-        :return        : Subplot of timeseries
-        :rtype         : plt.subplot
+        :return           : Subplot of timeseries
+        :rtype            : plt.subplot
         """
         if subplot is None:
-            data = self._data
-            data2 = self._data2
             dtype = self._dtype
             name = self._sensor_name
 
-            x, y1 = zip(*data)
-            y2 = zip(*data2)[1]
-
             types, units = zip(*dtype)
             type1 = types[0]
             type2 = types[1]
@@ -216,9 +530,9 @@ class DualSensor(Sensor):
 
             fig = plt.figure() 
             ax1 = plt.subplot()
-            ax1.plot(x, y1, 'r-', label=y1lab)
+            self._plot_channel(ax1, self._series, 'r-', y1lab, downsample)
             ax2 = ax1.twinx()
-            ax2.plot(x, y2, 'b-', label=y2lab)
+            self._plot_channel(ax2, self._series2, 'b-', y2lab, downsample)
             
             ax1.set_xlabel(xlab)
             ax1.set_ylabel(y1lab)
@@ -235,14 +549,9 @@ class DualSensor(Sensor):
 
             return ax1, ax2
         else:
-            data = self._data
-            data2 = self._data2
             dtype = self._dtype
             name = self._sensor_name
 
-            x, y1 = zip(*data)
-            y2 = zip(*data2)[1]
-
             types, units = zip(*dtype)
             type1 = types[0]
             type2 = types[1]
@@ -258,9 +567,10 @@ class DualSensor(Sensor):
             title_tmpl = '{}: \n{} and {}'
             title = title_tmpl.format(name, type1, type2)
 
-            subplot.plot(x, y1, 'r-', label=y1lab)
+            self._plot_channel(subplot, self._series, 'r-', y1lab,
+                               downsample)
             ax2 = subplot.twinx()
-            ax2.plot(x, y2, 'b-', label=y2lab)
+            self._plot_channel(ax2, self._series2, 'b-', y2lab, downsample)
             
             subplot.set_xlabel(xlab)
             subplot.set_ylabel(y1lab)
@@ -274,7 +584,11 @@ class DualSensor(Sensor):
             ax2.spines['left'].set_color('red')
             ax2.tick_params(axis='y', colors='blue')
             ax2.yaxis.label.set_color('blue')
-            
+
+    def _plot_channel(self, ax, series, style, label, downsample):
+        # Draw one of the two channels against its own timestamps
+        keep = plot_index(ax, series, series.values, downsample)
+        ax.plot(series.times[keep], series.values[keep], style, label=label)
     
     def plot_correlation(self):
         """Correlate the two sets of data in the DualSensor and plot
@@ -283,13 +597,11 @@ class DualSensor(Sensor):
         :return        : Subplot of timeseries
         :rtype         : plt.subplot
         """
-        data = self._data
-        data2 = self._data2
         dtype = self._dtype
         name = self._sensor_name
 
-        x, y1 = zip(*data)
-        y2 = zip(*data2)[1]
+        x = self.times
+        y1, y2 = self.values, self.values2
         
         types, units = zip(*dtype)
         type1 = types[0]
@@ -298,8 +610,8 @@ class DualSensor(Sensor):
         unit2 = units[1]
 
         n = len(x)
-        strt = x[1].strftime("%m/%d/%y")
-        stp = x[n - 1].strftime("%m/%d/%y")
+        strt = x[1].astype(object).strftime("%m/%d/%y")
+        stp = x[n - 1].astype(object).strftime("%m/%d/%y")
         
         corr = stats.pearsonr(y1, y2)[0]
         
@@ -327,10 +639,67 @@ class GridSensor(Sensor):
     """Grid Sensor subclass for the AoT IR grid sensor.
 
     This class overrides methods from the Sensor class to properly work
-    with grid data.
+    with grid data. Readings are stored as a cube of 4x4 frames, one per
+    timestamp; values holds the PTAT (ambient) channel.
+
+    ADDITIONAL VARIABLES
+        frames      :  array  : (time x 4 x 4) float64 array of pixel values;
+                                frames[i, r, c] is pixel 4 * r + c
+        pixels      :  array  : (time x 16) view of the frames
+        ambient     :  array  : PTAT (ambient) temperatures, same as values
+        data        :  list   : list of (datetime, [17 floats]) tuples, or 17
+                                lists of (datetime, float) tuples once sorted
+                                by pixel
     """
+    CHANNELS = dict(Sensor.CHANNELS, frames='_frames')
     def __init__(self, code):
         super(GridSensor, self).__init__(code)
+        self._frames = Series(GRID_SHAPE)
+        self._by_pixel = False
+
+    @property
+    def frames(self):
+        return self._frames.values
+
+    @property
+    def pixels(self):
+        return self._frames.values.reshape(len(self._frames), -1)
+
+    @property
+    def ambient(self):
+        return self._series.values
+
+    @property
+    def frame_stats(self):
+        return self._frames.stats
+
+    @property
+    def data(self):
+        times = self.times.astype(object)
+        channels = [self.ambient] + list(self.pixels.T)
+        if self._by_pixel:
+            return [zip(times, channel.tolist()) for channel in channels]
+        return zip(times, np.column_stack(channels).tolist())
+
+    def pixel(self, i):
+        """Timeseries of one pixel of the grid (a view, not a copy).
+
+        :param i : Index of the pixel (0 - 15)
+        :type  i : int
+        :return  : float64 array of the pixel's values
+        :rtype   : np.ndarray
+        """
+        return self.frames[:, i // GRID_SHAPE[1], i % GRID_SHAPE[1]]
+
+    def frame(self, i):
+        """4x4 frame of the grid at one timestamp (a view, not a copy).
+
+        :param i : Index of the timestamp
+        :type  i : int
+        :return  : 4x4 float64 array of pixel values
+        :rtype   : np.ndarray
+        """
+        return self.frames[i]
     
     def add_point(self, line):
         """Add one data point to the GridSensor from a formatted string.
@@ -340,237 +709,268 @@ class GridSensor(Sensor):
         :return     : None
         :rtype      : None
         """
-        arr = line.split(',')
-        name = arr[0]
-        timestamp = dt.datetime.strptime(arr[1], '%m/%d/%y %H:%M:%S')
-        vals = []
-        dtypes = []
+        code, name, stamp, data = tokenize(line)
+        timestamp = parse_timestamp(stamp)
+        self._set_info(name, data)
+
+        vals = [datum[1] for datum in data]
+        self._series.append(timestamp, vals[0])
+        self._frames.append(timestamp, np.reshape(vals[1:], GRID_SHAPE))
+
+    @classmethod
+    def pack_records(cls, records):
+        """Convert a batch of tokenized lines into the PTAT channel and the
+           4x4 frames of a GridSensor (see Sensor.pack_records).
+
+        :param records : (code, name, timestamp, data) tuples, not empty
+        :type  records : list
+        :return        : (name, data, count, channels) tuple
+        :rtype         : tuple
+        """
+        stamps = [record[2] for record in records]
+        rows = np.array([[datum[1] for datum in record[3]]
+                         for record in records], dtype=np.float64)
+
+        epochs = parse_timestamps(stamps)
+        channels = [('_series', epochs, rows[:, 0]),
+                    ('_frames', epochs,
+                     rows[:, 1:].reshape((-1,) + GRID_SHAPE))]
+        return records[-1][1], records[-1][3], len(records), channels
+
+    def _set_info(self, name, data):
         self._sensor_name = name
+        self._dtype = [(datum[0], datum[2]) for datum in data]
+        self._context = [datum[3] for datum in data]
 
-        data = arr[2:]
-        context = []
-        i = 0
-        for datum in data:
-            info = datum.split(';')
-            type0 = info[0]
-            unit = info[2]
-            val = float(info[1])
-            context.append(info[3])
-            
-            dtype = (type0, unit)
-            dtypes.append(dtype)
-            vals.append(val)
-        
-            self._dtype = dtypes
-            
-        self._context = context
-        self._data.append((timestamp, vals))
+    def save(self, path):
+        """Write the data in the GridSensor to .npy files in the directory
+           path (see Sensor.save).
+
+        :param path : Directory to write to
+        :type  path : str
+        :return     : Metadata needed by load
+        :rtype      : dict
+        """
+        meta = super(GridSensor, self).save(path)
+        meta['by_pixel'] = self._by_pixel
+        return meta
+
+    @classmethod
+    def load(cls, path, meta, mmap_mode='r'):
+        """Open a GridSensor written by save (see Sensor.load).
+
+        :param path      : Directory the GridSensor was written to
+        :type  path      : str
+        :param meta      : Metadata returned by save
+        :type  meta      : dict
+        :param mmap_mode : Memory map mode for np.load (None to read in)
+        :type  mmap_mode : str
+        :return          : The GridSensor
+        :rtype           : GridSensor
+        """
+        sensor = super(GridSensor, cls).load(path, meta, mmap_mode)
+        sensor._by_pixel = meta.get('by_pixel', False)
+        return sensor
+
+    def at(self, t, how='nearest'):
+        """Frame of the GridSensor closest to t (see Sensor.at).
+
+        :param t   : Point in time
+        :type  t   : dt.datetime
+        :param how : 'nearest' or 'asof'
+        :type  how : str
+        :return    : (datetime64, 4x4 array) tuple, or None if there is no
+                     reading; the frame is a view
+        :rtype     : tuple
+        """
+        i = self._frames.index(t, how)
+        if i is None:
+            return None
+        return self._frames.times[i], self.frames[i]
+
+    def summary(self):
+        """Running statistics of the GridSensor: elementwise 4x4 statistics
+           of the frames keyed by type of data, and the PTAT channel keyed by
+           its context.
+
+        :return : Dictionary of {type: RunningStats}
+        :rtype  : dict
+        """
+        if not self._dtype:
+            return {}
+        return {self._dtype[1][0]: self._frames.stats,
+                self._context[0]: self._series.stats}
+
+    def resample_many(self, windows, origin=None):
+        """Summarize the frames of the GridSensor at several resolutions
+           from one scan of the data (see Sensor.resample_many). Aggregates
+           are (bucket x 4 x 4) arrays.
+
+        :param windows : Widths of the buckets
+        :type  windows : list
+        :param origin  : Start of the first bucket in seconds since the
+                         epoch, defaults to the first timestamp
+        :type  origin  : int
+        :return        : Aggregates for each window, in the order given
+        :rtype         : list
+        """
+        return self._resample('frames', self._frames, windows, origin)
           
     def sort_by_pixel(self):
-        """Sort the data in the GridSensor by pixel.
+        """Sort the data in the GridSensor by pixel. The frames are not
+        moved; this only changes the layout returned by data.
 
         :return     : None
         :rtype      : None
         """
-        pixels = []
-        for i in range(17):
-            pix = []
-            pixels.append(pix)
-
-        j = 0
-        for instance in self._data:
-            time = instance[0]
-
-            for pix in pixels:
-                if j > 16:
-                    j = 0
-                
-                val = instance[1][j]
-                point = (time, val)
-                pix.append(point)
-                j+=1
-
-        self._data = pixels 
+        self._by_pixel = True
         
     def sort_by_time(self):
-        """Sort the data in the GridSensor by time.
+        """Sort the data in the GridSensor by time. The frames are not
+        moved; this only changes the layout returned by data.
 
         :return     : None
         :rtype      : None
         """
-        data = []
-        pixs = self._data
-        n = len(pixs[0])
-        
-        for i in range(n):
-            time = pixs[0][i][0]
-            dpoint = []
-            for pix in pixs:
-                point = pix[i][1]
-                dpoint.append(point)
-                
-            val = (time, dpoint)
-            data.append(val)
-            
-        self._data = data
+        self._by_pixel = False
     
     def smooth(self, hrs):
         """Smooths data from the GridSensor to designated hour averages 
-           (i.e. every 2hrs, 3hrs, etc)
+           (i.e. every 2hrs, 3hrs, etc). Windows start at the first reading.
            
            :return : List of averaged GridSensor data
            :rtype  : list
         """
-        delta = dt.timedelta(hours=hrs)
-        pixs = self._data[1:]
-        avgs = []
-        for i in range(len(pixs)):
-            avg = []
-            avgs.append(avg)
-            
-        i = 0
-        for pix in pixs:
-            strt = pix[0][0]
-            tot = 0
-            n = 0
-            j = 0
-            for p in pix:
-                currt = p[0]
-                diff = strt + delta
-                if diff > currt:
-                    tot += p[1]
-                    n += 1
-                    j += 1
-                else:
-                    avg = tot / n
-                    point = (strt, avg)
-                    avgs[i].append(point)
-                    strt = currt
-                    tot = 0
-                    n = 0
-                    
-                if j + 1 == len(p):
-                    avg = tot / n
-                    point = (strt, avg)
-                    avgs[i].append(point)
-                    tot = 0
-                    n = 0
-            i += 1
+        aggs = self.resample(dt.timedelta(hours=hrs))
+        times = aggs.times.astype(object)
+        means = aggs.mean.reshape(len(aggs), -1)
+        return [zip(times, pix.tolist()) for pix in means.T]
+
+    def _heatmaps(self, aggs):
+        # Bucket times and mean frames, transposed to the orientation the
+        # heatmaps have always been drawn in
+        return aggs.times.astype(object), aggs.mean.transpose(0, 2, 1)
         
-        return avgs
-        
-    def plot_heatmap(self, hrs):
+    def plot_heatmap(self, hrs, path='IR_Grid.pdf', writer='ffmpeg', fps=2,
+                     dpi=None):
         """Creates PDF containing heatmaps of the GridSensor. Each page is an 
            instance of the heatmap at a different point in time. GridSensor data
            is smoothed to intervals spanning the inputted number of hours (i.e. 
            every 2hrs, 3hrs, etc.)
+
+           The figure is drawn once and only the colors of its mesh and the
+           title change from page to page, and every page is written out as
+           soon as it is drawn, so each page costs the same however many
+           there are. Instead of a PDF, the heatmaps can be exported as PNG
+           frames or as a movie.
            
-           :param hrs : Number of hours to smooth by
-           :type  hrs : int
+           :param hrs    : Number of hours to smooth by
+           :type  hrs    : int
+           :param path   : File to export to: a PDF (one page per heatmap),
+                           PNG frames (path is formatted with the frame
+                           number, e.g. 'IR_Grid_{:04d}.png', which is
+                           appended if there is no field) or a movie (e.g.
+                           .mp4 or .gif) encoded by writer
+           :type  path   : str
+           :param writer : Name of a matplotlib.animation writer, or a
+                           MovieWriter, for movies
+           :type  writer : str
+           :param fps    : Frames per second of movies
+           :type  fps    : int
+           :param dpi    : Resolution of PNG frames and movies, the figure's
+                           by default
+           :type  dpi    : int
            
            :return : Exports PDF file of heatmap
            :rtype  : None
         """
-        
-        avgs = self.smooth(hrs)
+        aggs = self.resample(dt.timedelta(hours=hrs))
+        times, hmaps = self._heatmaps(aggs)
+        if not len(hmaps):
+            return
+
+        fig, image, title = self._heatmap_figure(hmaps)
+        frames = self._heatmap_frames(image, title, times, hmaps)
+        try:
+            ext = os.path.splitext(path)[1].lower()
+            if ext == '.pdf':
+                pp = PdfPages(path)
+                try:
+                    for i in frames:
+                        pp.savefig(fig)
+                finally:
+                    pp.close()
+            elif ext == '.png':
+                if '{' not in path:
+                    path = os.path.splitext(path)[0] + '_{:04d}' + ext
+                for i in frames:
+                    fig.savefig(path.format(i), dpi=dpi)
+            else:
+                if isinstance(writer, basestring):
+                    writer = animation.writers[writer](fps=fps)
+                with writer.saving(fig, path, dpi or fig.dpi):
+                    for i in frames:
+                        writer.grab_frame()
+        finally:
+            plt.close(fig)
+
+    def _heatmap_figure(self, hmaps):
+        # Figure for plot_heatmap with a single mesh, laid out the way the
+        # pcolor heatmaps always were: first row at the top, columns
+        # labelled along the top
         row_labels = list('1234')
         column_labels = list('1234')
-        arr = []
-        times = []
-        mins = []
-        maxs = []
-        j = 0
-        for i in range(len(avgs[0])):
-            j = 0
-            darr = [[],[],[],[]]
-            for avg in avgs:
-                if j > 3:
-                    j = 0
-                darr[j].append(avg[i][1])
-                j+=1
-
-            time = avgs[0][i][0]
-            point = (time, np.array(darr))
-            arr.append(point)
-
-        for time, data in arr:
-            mini = data.min()
-            maxi = data.max()
-
-            mins.append(mini)
-            maxs.append(maxi)
+        nrows, ncols = hmaps.shape[1:]
 
-        minis = np.array(mins)
-        maxis = np.array(maxs)
-
-        mini = int(minis.min())
-        maxi = int(maxis.max())
-        
         fig = plt.figure(figsize=(8, 11))
         fig.suptitle(self.sensor_name, fontsize='x-large')
-        pp = PdfPages('IR_Grid.pdf')
-        i = 0
-        for time, data in arr:
-            sub_plot = plt.subplot()
-            title = str(time.hour) + ":00"
-            sub_plot.pcolor(data, cmap=cmaps.Reds, vmin=mini, vmax=maxi)
-
-            sub_plot.set_xticks(np.arange(data.shape[0])+0.5, minor=False)
-            sub_plot.set_yticks(np.arange(data.shape[1])+0.5, minor=False)
-
-            sub_plot.invert_yaxis()
-            sub_plot.xaxis.tick_top()
-
-            sub_plot.set_xticklabels(row_labels, minor=False)
-            sub_plot.set_yticklabels(column_labels, minor=False)
-            sub_plot.set_title(title, y=1.02)
-            pp.savefig()
-            i+=1
-
-        pp.close()
-        
+        sub_plot = fig.add_subplot(111)
+        image = sub_plot.pcolormesh(hmaps[0], cmap=cmaps.Reds,
+                                    vmin=int(hmaps.min()),
+                                    vmax=int(hmaps.max()))
+        sub_plot.set_xlim(0, ncols)
+        sub_plot.set_ylim(nrows, 0)
+
+        sub_plot.set_xticks(np.arange(ncols)+0.5, minor=False)
+        sub_plot.set_yticks(np.arange(nrows)+0.5, minor=False)
+        sub_plot.xaxis.tick_top()
+
+        sub_plot.set_xticklabels(row_labels, minor=False)
+        sub_plot.set_yticklabels(column_labels, minor=False)
+        title = sub_plot.set_title('', y=1.02)
+        return fig, image, title
+
+    def _heatmap_frames(self, image, title, times, hmaps):
+        # Show each heatmap in turn, yielding its index once it is in place
+        for i, (time, data) in enumerate(zip(times, hmaps)):
+            image.set_array(data.ravel())
+            title.set_text(str(time.hour) + ":00")
+            yield i
         
-    def view_grid(self):
+    def view_grid(self, path='IR_Grid.png', show=True):
         """Creates visualization of the AoT IR grid in the form of 12 two hour
            averaged heatmaps, one 24 hour average heatmap, and a timeseries for
            of the data in the GridSensor
            
+           :param path : File the figure is saved to
+           :type  path : str
+           :param show : False to close the figure once saved instead of
+                         showing it, e.g. when rendering without a display
+           :type  show : bool
+
            :return : Exports PNG file of plots
            :rtype  : None
         """
-        avgs2 = self.smooth(2)
-        avgs24 = self.smooth(23)
+        aggs2, aggs24 = self.resample_many([dt.timedelta(hours=2),
+                                            dt.timedelta(hours=24)])
         row_labels = list('1234')
         column_labels = list('1234')
-        arr = []
-        mins = []
-        maxs = []
-        j = 0
-        for i in range(len(avgs2[0])):
-            j = 0
-            darr = [[],[],[],[]]
-            for avg in avgs2:
-                if j > 3:
-                    j = 0
-                darr[j].append(avg[i][1])
-                j+=1
-
-            time = avgs2[0][i][0]
-            point = (time, np.array(darr))
-            arr.append(point)
-
-        for time, data in arr:
-            mini = data.min()
-            maxi = data.max()
-
-            mins.append(mini)
-            maxs.append(maxi)
+        times, hmaps = self._heatmaps(aggs2)
+        # There are panels for the first day's 12 two hour averages
+        arr = zip(times, hmaps)[:12]
 
-        minis = np.array(mins)
-        maxis = np.array(maxs)
-
-        mini = int(minis.min())
-        maxi = int(maxis.max())
+        mini = int(hmaps.min())
+        maxi = int(hmaps.max())
         fig = plt.figure(figsize=(11, 8))
         fig.suptitle(self._sensor_name, fontsize='x-large')
         sub_plots = []
@@ -603,35 +1003,11 @@ class GridSensor(Sensor):
             sub_plot.set_title(title, y=1.14)
             i+=1
             
-        arr1 = []
-        mins1 = []
-        maxs1 = []
-        j = 0
-        for i in range(len(avgs24[0])):
-            j = 0
-            darr = [[],[],[],[]]
-            for avg in avgs24:
-                if j > 3:
-                    j = 0
-                darr[j].append(avg[i][1])
-                j+=1
-
-            time = avgs24[0][i][0]
-            point = (time, np.array(darr))
-            arr1.append(point)
-
-        for time, data in arr1:
-            mini = data.min()
-            maxi = data.max()
-
-            mins1.append(mini)
-            maxs1.append(maxi)
-
-        minis1 = np.array(mins1)
-        maxis1 = np.array(maxs1)
-
-        mini1 = int(minis1.min())
-        maxi1 = int(maxis1.max())
+        times1, hmaps1 = self._heatmaps(aggs24)
+        arr1 = zip(times1, hmaps1)
+
+        mini1 = int(hmaps1.min())
+        maxi1 = int(hmaps1.max())
         
         hmap = sub_plots[12]
         time = arr[0][0]
@@ -652,8 +1028,11 @@ class GridSensor(Sensor):
         tser = sub_plots[13]
         self.plot_timeseries(tser)
         plt.subplots_adjust(wspace=0.2, hspace=0.4)
-        fig.savefig('IR_Grid.png')
-        plt.show()
+        fig.savefig(path)
+        if show:
+            plt.show()
+        else:
+            plt.close(fig)
     
     def plot_timeseries(self, subplots=None):
         """Create a timeseries plot for each pixel in the grid
@@ -664,7 +1043,6 @@ class GridSensor(Sensor):
         :rtype       : list
         """
         if subplots == None:
-            pixs = self._data
             sub_plots = []
             l = 4
             w = 4
@@ -676,8 +1054,7 @@ class GridSensor(Sensor):
 
             i = 1
             for sub_plot in sub_plots:
-                pix = pixs[i]
-                x, y = zip(*pix)
+                x, y = self.times, self.pixel(i - 1)
                 sub_plot.plot_date(x, y, fmt='r-')
                 sub_plot.set_xlabel('Time')
                 sub_plot.set_ylabel('Temperature (C)')
@@ -689,8 +1066,7 @@ class GridSensor(Sensor):
         else:
             i = 1
             for sub_plot in sub_plots:
-                pix = pixs[i]
-                x, y = zip(*pix)
+                x, y = self.times, self.pixel(i - 1)
                 sub_plot.plot_date(x, y, fmt='r-')
                 sub_plot.set_xlabel('Time')
                 sub_plot.set_ylabel('Temperature (C)')
@@ -698,16 +1074,18 @@ class GridSensor(Sensor):
                 i+=1
             plt.subplots_adjust(wspace=0.2, hspace=1)
     
-    def plot_timeseries(self, subplot=None):
+    def plot_timeseries(self, subplot=None, downsample=True):
         """Create a timeseries plot from the data in the Sensor.
 
-        :param subplot : None
-        :type  subplot : plt.subplot
-        :return        : Subplot of timeseries
-        :rtype         : plt.subplot
+        :param subplot    : None
+        :type  subplot    : plt.subplot
+        :param downsample : False to draw every reading of long series
+                            (see plot_index)
+        :type  downsample : bool
+        :return           : Subplot of timeseries
+        :rtype            : plt.subplot
         """
         if subplot is None:
-            data = self._data
             dtype = self._dtype
             name = self._sensor_name
 
@@ -723,17 +1101,15 @@ class GridSensor(Sensor):
 
             fig = plt.figure() 
             ax1 = plt.subplot()
-            pixs = self._data[0:]
-            for pix in pixs:
-                x, y = zip(*pix)
-                ax1.plot(x, y, 'r-', label=type)
+            x, ambient, pixels = self._plot_frames(ax1, downsample)
+            ax1.plot(x, ambient, 'r-', label=type)
+            ax1.plot(x, pixels, 'r-', label=type)
             ax1.set_xlabel(xlab)
             ax1.set_ylabel(ylab)
             ax1.set_title(title)
 
             return ax1
         else:
-            data = self._data
             dtype = self._dtype
             name = self._sensor_name
 
@@ -747,11 +1123,18 @@ class GridSensor(Sensor):
             title_tmpl = '{}: \n{}'
             title = title_tmpl.format(name, type0)
             
-            pixs = self._data[0:]
-            for pix in pixs:
-                x, y = zip(*pix)
-                subplot.plot(x, y, 'r-', label=type0)
+            x, ambient, pixels = self._plot_frames(subplot, downsample)
+            subplot.plot(x, ambient, 'r-', label=type0)
+            subplot.plot(x, pixels, 'r-', label=type0)
             subplot.set_xlabel(xlab)
             subplot.set_ylabel(ylab)
             subplot.set_title(title)
+
+    def _plot_frames(self, ax, downsample):
+        # Times, ambient and pixel readings worth drawing on ax, keeping
+        # the peaks of every pixel
+        ambient, pixels = self.ambient, self.pixels
+        keep = plot_index(ax, self._series, np.column_stack((ambient, pixels)),
+                          downsample)
+        return self.times[keep], ambient[keep], pixels[keep]
             
\ No newline at end of file
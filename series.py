@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import datetime as dt
+import numpy as np
+from summary import RunningStats
+
+
+EPOCH = dt.datetime(1970, 1, 1)
+
+CHUNK = 4096
+
+
+def to_epoch(t):
+    """Convert datetime object to integer seconds since the epoch
+
+    :param t : datetime object
+    :type  t : dt.datetime
+    :return  : Seconds since 1970-01-01 00:00:00
+    :rtype   : int
+    """
+    delta = t - EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def as_epoch(t):
+    """Convert a datetime, datetime64 or number of seconds to integer
+    seconds since the epoch
+
+    :param t : Point in time
+    :type  t : dt.datetime
+    :return  : Seconds since 1970-01-01 00:00:00
+    :rtype   : int
+    """
+    if isinstance(t, dt.datetime):
+        return to_epoch(t)
+    if isinstance(t, np.datetime64):
+        return int(t.astype('M8[s]').astype(np.int64))
+    return int(t)
+
+
+class Series(object):
+    """Series class for storing sensor readings as growable typed arrays.
+
+    Timestamps are kept as int64 seconds since the epoch and values as
+    float64, either one value per timestamp or a fixed-width row of values
+    per timestamp. Capacity grows in chunks so appends are amortized O(1).
+
+    INSTANCE VARIABLES
+        epochs : np.ndarray : int64 view of the timestamps (seconds)
+        times  : np.ndarray : datetime64[s] view of the timestamps
+        values : np.ndarray : float64 view of the values
+        width  : int        : Number of values per timestamp (None for 1-D),
+                              or the shape of the values at each timestamp
+        stats  : RunningStats : Statistics of the values, kept up to date as
+                                readings are added
+    """
+    def __init__(self, width=None, capacity=CHUNK):
+        self._width = width
+        self._n = 0
+        self._epochs = np.empty(capacity, dtype=np.int64)
+        self._values = np.empty(self._shape(capacity), dtype=np.float64)
+        self._stats = RunningStats()
+        self._sorted = True
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def width(self):
+        return self._width
+
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = RunningStats.from_arrays(self.epochs, self.values)
+        return self._stats
+
+    @property
+    def epochs(self):
+        return self._epochs[:self._n]
+
+    @property
+    def times(self):
+        return self._epochs[:self._n].view('M8[s]')
+
+    @property
+    def values(self):
+        return self._values[:self._n]
+
+    def append(self, timestamp, value):
+        """Append one reading to the Series.
+
+        :param timestamp : Time of the reading
+        :type  timestamp : dt.datetime
+        :param value     : Value (or row of values) of the reading
+        :type  value     : float
+        :return          : None
+        :rtype           : None
+        """
+        self.reserve(1)
+        epoch = to_epoch(timestamp)
+        if self._n and epoch < self._epochs[self._n - 1]:
+            self._sorted = False
+        self._epochs[self._n] = epoch
+        self._values[self._n] = value
+        # Built (if need be) before the reading counts, so it is only added
+        # once
+        stats = self.stats
+        self._n += 1
+        stats.update(epoch, value)
+
+    def extend(self, epochs, values):
+        """Append a batch of readings to the Series.
+
+        :param epochs : Timestamps of the readings in seconds since the epoch
+        :type  epochs : np.ndarray
+        :param values : Values (or rows of values) of the readings
+        :type  values : np.ndarray
+        :return       : None
+        :rtype        : None
+        """
+        n = len(epochs)
+        if not n:
+            return
+
+        self.reserve(n)
+        new = self._epochs[self._n:self._n + n]
+        new[:] = epochs
+        self._values[self._n:self._n + n] = values
+        if self._n and new[0] < self._epochs[self._n - 1]:
+            self._sorted = False
+        elif (np.diff(new) < 0).any():
+            self._sorted = False
+        self.stats.update_batch(new, self._values[self._n:self._n + n])
+        self._n += n
+
+    def reserve(self, n):
+        """Make room for at least n more readings, growing the arrays by
+           doubling (and never by less than one chunk).
+
+        :param n : Number of readings to make room for
+        :type  n : int
+        :return  : None
+        :rtype   : None
+        """
+        needed = self._n + n
+        capacity = len(self._epochs)
+        if needed <= capacity:
+            return
+
+        capacity = max(needed, 2 * capacity, CHUNK)
+        epochs = np.empty(capacity, dtype=np.int64)
+        values = np.empty(self._shape(capacity), dtype=np.float64)
+        epochs[:self._n] = self._epochs[:self._n]
+        values[:self._n] = self._values[:self._n]
+        self._epochs = epochs
+        self._values = values
+
+    def save(self, prefix):
+        """Write the Series to prefix.epochs.npy and prefix.values.npy.
+
+        :param prefix : Path prefix of the files
+        :type  prefix : str
+        :return       : Statistics of the Series (see RunningStats.to_dict)
+        :rtype        : dict
+        """
+        np.save(prefix + '.epochs.npy', self.epochs)
+        np.save(prefix + '.values.npy', self.values)
+        return self.stats.to_dict()
+
+    @classmethod
+    def load(cls, prefix, stats=None, mmap_mode='r'):
+        """Open a Series written by save. By default the arrays are memory
+           mapped read-only, so nothing is read from disk until it is used;
+           adding readings copies them into memory first.
+
+        :param prefix    : Path prefix of the files
+        :type  prefix    : str
+        :param stats     : Saved statistics, recomputed if not given
+        :type  stats     : dict
+        :param mmap_mode : Memory map mode for np.load (None to read in)
+        :type  mmap_mode : str
+        :return          : The Series
+        :rtype           : Series
+        """
+        epochs = np.load(prefix + '.epochs.npy', mmap_mode=mmap_mode)
+        values = np.load(prefix + '.values.npy', mmap_mode=mmap_mode)
+
+        width = values.shape[1:]
+        if not width:
+            width = None
+        elif len(width) == 1:
+            width = width[0]
+
+        series = cls(width, capacity=0)
+        series._epochs = epochs
+        series._values = values
+        series._n = len(epochs)
+        series._sorted = None
+        if stats is None:
+            series._stats = None
+        else:
+            series._stats = RunningStats.from_dict(stats)
+        return series
+
+    def sort(self):
+        """Put the readings in chronological order (stable, so readings
+           with the same timestamp keep their order). Readings added in
+           order, the normal case, are never moved.
+
+        :return : None
+        :rtype  : None
+        """
+        if self._sorted is None:
+            self._sorted = not (np.diff(self.epochs) < 0).any()
+        if self._sorted:
+            return
+
+        order = np.argsort(self.epochs, kind='mergesort')
+        self._epochs = self.epochs[order]
+        self._values = self.values[order]
+        self._sorted = True
+
+    def span(self, t0=None, t1=None):
+        """Index range of the readings in [t0, t1), found by binary search.
+
+        :param t0 : Start of the range (inclusive), None for the beginning
+        :type  t0 : dt.datetime
+        :param t1 : End of the range (exclusive), None for the end
+        :type  t1 : dt.datetime
+        :return   : (start, stop) indices
+        :rtype    : tuple
+        """
+        self.sort()
+        epochs = self.epochs
+        start = 0
+        stop = self._n
+        if t0 is not None:
+            start = epochs.searchsorted(as_epoch(t0), 'left')
+        if t1 is not None:
+            stop = epochs.searchsorted(as_epoch(t1), 'left')
+        return int(start), int(max(start, stop))
+
+    def between(self, t0=None, t1=None):
+        """Readings in [t0, t1) as a Series of views onto this one's arrays.
+
+        :param t0 : Start of the range (inclusive), None for the beginning
+        :type  t0 : dt.datetime
+        :param t1 : End of the range (exclusive), None for the end
+        :type  t1 : dt.datetime
+        :return   : Series sharing this Series' memory
+        :rtype    : Series
+        """
+        start, stop = self.span(t0, t1)
+        series = Series(self._width, capacity=0)
+        series._epochs = self._epochs[start:stop]
+        series._values = self._values[start:stop]
+        series._n = stop - start
+        series._stats = None
+        return series
+
+    def index(self, t, how='nearest'):
+        """Index of the reading closest to t, found by binary search.
+
+        :param t   : Point in time
+        :type  t   : dt.datetime
+        :param how : 'nearest' for the closest reading, 'asof' for the last
+                     reading at or before t
+        :type  how : str
+        :return    : Index of the reading, or None if there is none
+        :rtype     : int
+        """
+        if how not in ('nearest', 'asof'):
+            raise ValueError("how must be 'nearest' or 'asof'")
+        if not self._n:
+            return None
+
+        self.sort()
+        t = as_epoch(t)
+        epochs = self.epochs
+        i = int(epochs.searchsorted(t, 'right')) - 1
+        if how == 'asof':
+            return i if i >= 0 else None
+
+        if i < 0:
+            return 0
+        if i + 1 < self._n and epochs[i + 1] - t < t - epochs[i]:
+            return i + 1
+        return i
+
+    def tuples(self):
+        """List of (datetime, value) tuples, the storage format used before
+           Series was introduced.
+
+        :return : List of (datetime, float) tuples
+        :rtype  : list
+        """
+        return zip(self.times.astype(object), self.values.tolist())
+
+    def _shape(self, capacity):
+        if self._width is None:
+            return (capacity,)
+        if isinstance(self._width, tuple):
+            return (capacity,) + self._width
+        return (capacity, self._width)
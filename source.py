@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import tarfile
+import zipfile
+import threading
+from collections import OrderedDict
+from constants import DATA_LAYOUT, CHUNK_SIZE, ARCHIVE_BUFFER
+
+
+def read_chunks(handle, chunk_size=CHUNK_SIZE, stats=None):
+    """Read an open file in chunks, closing it at the end.
+
+    :param handle     : Open file
+    :type  handle     : file
+    :param chunk_size : Number of bytes read at a time
+    :type  chunk_size : int
+    :param stats      : Filled in with the bytes read and the time taken
+    :type  stats      : FetchStats
+    :return           : Generator of the chunks of the file
+    :rtype            : generator
+    """
+    with handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                if stats is not None:
+                    stats.elapsed = time.time() - stats.started
+                return
+            if stats is not None:
+                stats.bytes += len(chunk)
+            yield chunk
+
+
+def skip_bytes(chunks, offset):
+    """Drop the first bytes of a file.
+
+    :param chunks : Chunks of the file
+    :type  chunks : iterable
+    :param offset : Number of bytes to drop
+    :type  offset : int
+    :return       : Generator of the chunks after offset
+    :rtype        : generator
+    """
+    for chunk in chunks:
+        if offset:
+            n = min(offset, len(chunk))
+            chunk = chunk[n:]
+            offset -= n
+        if chunk:
+            yield chunk
+
+
+def _format(layout, node, hour):
+    # Layouts are formatted with the node, month, day, year and hour, the
+    # way DATA_URI always has been
+    return layout.format(node, '%02d' % hour.month, '%02d' % hour.day,
+                         str(hour.year), '%02d' % hour.hour)
+
+
+class Source(object):
+    """Source class for where hourly AoT data files are read from. A Fetcher
+    reads every file through its Source: the Source names the file of a
+    node and hour (url) and opens it (open, open_new); the Fetcher adds the
+    parallel downloads, the Cache and the statistics.
+
+    Subclasses implement open, and url when files are not named by
+    formatting layout alone.
+
+    INSTANCE VARIABLES
+        layout     : str  : Template of the name of an hourly file,
+                            formatted with the node, month, day, year and
+                            hour
+        chunk_size : int  : Number of bytes read at a time
+        remote     : bool : True if files are worth keeping in a Cache
+    """
+    remote = False
+
+    def __init__(self, layout=DATA_LAYOUT, chunk_size=CHUNK_SIZE):
+        self._layout = layout
+        self._chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def layout(self):
+        return self._layout
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    def url(self, node, hour):
+        """Name of the hourly data file of a node.
+
+        :param node : Name of the AoT node
+        :type  node : str
+        :param hour : Start of the hour
+        :type  hour : dt.datetime
+        :return     : URL (or path, or archive member) of the file
+        :rtype      : str
+        """
+        return _format(self._layout, node, hour)
+
+    def open(self, url, stats):
+        """Open an hourly data file.
+
+        :param url   : URL of the file (see url)
+        :type  url   : str
+        :param stats : Filled in with where the file came from, the latency
+                       and the bytes read
+        :type  stats : FetchStats
+        :return      : Generator of the chunks of the file, or None if the
+                       file is missing
+        :rtype       : generator
+        """
+        raise NotImplementedError
+
+    def open_new(self, url, revision, stats):
+        """Open the part of an hourly data file appended since it was last
+           read. Local files do not change behind our back, so by default
+           the whole file is read and the bytes before revision.offset are
+           dropped.
+
+        :param url      : URL of the file (see url)
+        :type  url      : str
+        :param revision : Part of the file already read
+        :type  revision : Revision
+        :param stats    : Filled in with the latency and the bytes read
+        :type  stats    : FetchStats
+        :return         : Generator of the chunks of the file after offset,
+                          or None if the file is missing
+        :rtype          : generator
+        """
+        chunks = self.open(url, stats)
+        if chunks is None:
+            return None
+        return skip_bytes(chunks, revision.offset)
+
+    def close(self):
+        """Release whatever the Source holds open.
+
+        :return : None
+        :rtype  : None
+        """
+
+
+class DirectorySource(Source):
+    """DirectorySource class for hourly files kept in a local directory
+    tree laid out like the data host (see DATA_LAYOUT), e.g. a mirror of
+    the host, a tree written by RecordingSource or generated benchmark
+    data. Files are read straight from disk.
+
+    INSTANCE VARIABLES
+        root : str : Directory holding the tree
+    """
+    def __init__(self, root, layout=DATA_LAYOUT, chunk_size=CHUNK_SIZE):
+        Source.__init__(self, layout, chunk_size)
+        self._root = root
+
+    def __repr__(self):
+        return 'DirectorySource({!r})'.format(self._root)
+
+    @property
+    def root(self):
+        return self._root
+
+    def url(self, node, hour):
+        return os.path.join(self._root, Source.url(self, node, hour))
+
+    def open(self, url, stats):
+        try:
+            handle = open(url, 'rb')
+        except IOError:
+            stats.source = 'missing'
+            return None
+        stats.source = 'local'
+        stats.latency = time.time() - stats.started
+        return read_chunks(handle, self._chunk_size, stats)
+
+
+class ArchiveSource(Source):
+    """ArchiveSource class for hourly files packed in a tar (optionally
+    gzip or bzip2 compressed) or zip archive, read without extracting it.
+    Members are found by the end of their name, so the layout may sit under
+    a top directory inside the archive.
+
+    Zip members and uncompressed tar members are read directly. Compressed
+    tar archives can only be decompressed from the start, so members passed
+    over on the way to the one asked for are kept (up to buffer bytes) for
+    the requests likely to follow. Archives whose members are in
+    chronological order (as pack writes them) are read in a single pass;
+    in any other order, going back to an earlier member means
+    decompressing from the start again, so repack those with pack (or use
+    zip) before replaying them.
+
+    INSTANCE VARIABLES
+        path   : str : Path of the archive
+        buffer : int : Maximum number of bytes of members read ahead
+    """
+    def __init__(self, path, layout=DATA_LAYOUT, chunk_size=CHUNK_SIZE,
+                 buffer=ARCHIVE_BUFFER):
+        Source.__init__(self, layout, chunk_size)
+        self._path = path
+        self._buffer = buffer
+        self._depth = layout.count('/') + 1
+        self._lock = threading.Lock()
+        self._tar = None
+        self._zip = None
+        self._compressed = False
+        self._members = None
+        self._index = None
+        self._next = 0
+        self._ahead = OrderedDict()
+        self._ahead_bytes = 0
+
+    def __repr__(self):
+        return 'ArchiveSource({!r})'.format(self._path)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def buffer(self):
+        return self._buffer
+
+    def open(self, url, stats):
+        with self._lock:
+            if self._index is None:
+                self._open_archive()
+            i = self._index.get(url)
+            if i is None:
+                stats.source = 'missing'
+                return None
+            data = self._read_member(i)
+        stats.source = 'local'
+        stats.latency = time.time() - stats.started
+        return self._chunks(data, stats)
+
+    def close(self):
+        with self._lock:
+            if self._tar is not None:
+                self._tar.close()
+            if self._zip is not None:
+                self._zip.close()
+            self._tar = self._zip = None
+            self._members = self._index = None
+            self._ahead.clear()
+            self._ahead_bytes = 0
+
+    def _open_archive(self):
+        # Index the members by the last parts of their names, as many as
+        # there are in the layout
+        if zipfile.is_zipfile(self._path):
+            self._zip = zipfile.ZipFile(self._path)
+            members = [info for info in self._zip.infolist()
+                       if not info.filename.endswith('/')]
+            names = [info.filename for info in members]
+        else:
+            self._tar = tarfile.open(self._path, 'r:*')
+            self._compressed = not isinstance(self._tar.fileobj, file)
+            members = [info for info in self._tar.getmembers()
+                       if info.isfile()]
+            names = [info.name for info in members]
+        self._members = members
+        self._index = {}
+        for i, name in enumerate(names):
+            key = '/'.join(name.split('/')[-self._depth:])
+            self._index.setdefault(key, i)
+        self._next = 0
+
+    def _read_member(self, i):
+        # Bytes of the i-th member; called with the lock held
+        member = self._members[i]
+        if self._zip is not None:
+            return self._zip.read(member)
+
+        data = self._ahead.pop(member.name, None)
+        if data is not None:
+            self._ahead_bytes -= len(data)
+            return data
+
+        if self._compressed:
+            # Compressed: reaching this member means decompressing the ones
+            # before it anyway, so keep them
+            for j in xrange(self._next, i):
+                self._keep(self._members[j])
+        data = self._tar.extractfile(member).read()
+        self._next = i + 1
+        return data
+
+    def _keep(self, member):
+        if member.size > self._buffer:
+            return
+        self._ahead[member.name] = self._tar.extractfile(member).read()
+        self._ahead_bytes += member.size
+        while self._ahead_bytes > self._buffer:
+            name, data = self._ahead.popitem(last=False)
+            self._ahead_bytes -= len(data)
+
+    def _chunks(self, data, stats):
+        for i in xrange(0, len(data), self._chunk_size):
+            chunk = data[i:i + self._chunk_size]
+            stats.bytes += len(chunk)
+            yield chunk
+        stats.elapsed = time.time() - stats.started
+
+
+class RecordingSource(Source):
+    """RecordingSource class for recording a pull: every file read through
+    the wrapped Source is also written to a directory tree laid out like
+    the data host, so the pull can be replayed later, byte for byte, with a
+    DirectorySource (or an ArchiveSource over the tree packed with pack).
+    Files appended to by refreshes are appended to in the tree as well.
+    Missing files are not recorded, so they are missing on replay too.
+
+    Fetchers do not cache files read through a RecordingSource, so that
+    every file gets recorded.
+
+    INSTANCE VARIABLES
+        source : Source : Source the files are read from
+        root   : str    : Directory the files are recorded to
+    """
+    def __init__(self, source, root, layout=DATA_LAYOUT):
+        Source.__init__(self, layout, source.chunk_size)
+        self._source = source
+        self._root = root
+        self._paths = {}
+
+    def __repr__(self):
+        return 'RecordingSource({!r}, {!r})'.format(self._source, self._root)
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def root(self):
+        return self._root
+
+    def url(self, node, hour):
+        url = self._source.url(node, hour)
+        self._paths[url] = os.path.join(self._root,
+                                        _format(self._layout, node, hour))
+        return url
+
+    def open(self, url, stats):
+        chunks = self._source.open(url, stats)
+        if chunks is None:
+            return None
+        return self._record(chunks, self._paths[url], 0)
+
+    def open_new(self, url, revision, stats):
+        chunks = self._source.open_new(url, revision, stats)
+        if chunks is None:
+            return None
+        path = self._paths[url]
+        if revision.offset and (not os.path.isfile(path) or
+                                os.path.getsize(path) < revision.offset):
+            # The start of the file was never recorded
+            return chunks
+        return self._record(chunks, path, revision.offset)
+
+    def close(self):
+        self._source.close()
+
+    def _record(self, chunks, path, offset):
+        # Write the chunks to path from offset on as they are read. Whole
+        # files go to a temporary file first so an interrupted read leaves
+        # nothing behind
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                if not os.path.isdir(dirname):
+                    raise
+
+        if offset:
+            f = open(path, 'r+b')
+            f.seek(offset)
+            f.truncate()
+        else:
+            f = open(path + '.part', 'wb')
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+        except BaseException:
+            f.close()
+            if not offset:
+                os.remove(path + '.part')
+            raise
+        f.close()
+        if not offset:
+            os.rename(path + '.part', path)
+
+
+def pack(root, path, layout=DATA_LAYOUT):
+    """Pack a directory tree of hourly files (e.g. written by
+       RecordingSource) into an archive for ArchiveSource. Files are stored
+       in chronological order, nodes interleaved, so a Node or an AoT
+       object replaying the archive reads it in a single pass. The format
+       is chosen from the extension of path: .zip, .tar, .tar.gz (.tgz) or
+       .tar.bz2 (.tbz2).
+
+    :param root   : Directory holding the tree
+    :type  root   : str
+    :param path   : Path of the archive to write
+    :type  path   : str
+    :param layout : Template of the names of the hourly files
+    :type  layout : str
+    :return       : Number of files packed
+    :rtype        : int
+    """
+    fields = re.escape(layout).replace(r'\{\}', '([^/]+)')
+    fields = re.compile(fields + '$')
+
+    names = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for fname in filenames:
+            if fname.endswith('.part'):
+                continue
+            name = os.path.relpath(os.path.join(dirpath, fname), root)
+            name = name.replace(os.sep, '/')
+            match = fields.search(name)
+            if match is None:
+                names.append(((1,), name))
+                continue
+            node, mm, dd, yy, hh = match.groups()
+            names.append(((0, yy, mm, dd, hh, node), name))
+    names = [name for key, name in sorted(names)]
+
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as archive:
+            for name in names:
+                archive.write(os.path.join(root, name), name)
+        return len(names)
+
+    mode = 'w'
+    if path.endswith(('.tar.gz', '.tgz')):
+        mode = 'w:gz'
+    elif path.endswith(('.tar.bz2', '.tbz2')):
+        mode = 'w:bz2'
+    archive = tarfile.open(path, mode)
+    try:
+        for name in names:
+            archive.add(os.path.join(root, name), name)
+    finally:
+        archive.close()
+    return len(names)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+STATE = ['count', 'mean', 'm2', 'min', 'min_time', 'max', 'max_time',
+         'first', 'first_time', 'last', 'last_time']
+
+
+def _time(epoch):
+    # Epoch seconds (scalar or array) as datetime64
+    if epoch is None:
+        return None
+    return np.asarray(epoch, dtype=np.int64).astype('M8[s]')[()]
+
+
+def _pick(cond, a, b):
+    return np.where(cond, a, b)[()]
+
+
+class RunningStats(object):
+    """RunningStats class for summary statistics maintained as data arrives.
+
+    Count, mean and variance are kept with Welford's algorithm; min and max
+    are kept with their timestamps, along with the first and last readings.
+    Values may be scalars or fixed-shape arrays (e.g. 4x4 frames), in which
+    case every statistic is elementwise. RunningStats objects can be merged,
+    so summaries over several nodes or date ranges never touch raw points.
+
+    INSTANCE VARIABLES
+        count      : int        : Number of readings
+        mean       : float      : Mean of the readings
+        variance   : float      : Population variance of the readings
+        std        : float      : Population standard deviation
+        min        : float      : Smallest reading
+        min_time   : datetime64 : Time of the smallest reading
+        max        : float      : Largest reading
+        max_time   : datetime64 : Time of the largest reading
+        first      : float      : Earliest reading
+        first_time : datetime64 : Time of the earliest reading
+        last       : float      : Latest reading
+        last_time  : datetime64 : Time of the latest reading
+    """
+    def __init__(self):
+        self._count = 0
+        self._mean = None
+        self._m2 = None
+        self._min = None
+        self._min_time = None
+        self._max = None
+        self._max_time = None
+        self._first = None
+        self._first_time = None
+        self._last = None
+        self._last_time = None
+
+    def __repr__(self):
+        tmpl = 'RunningStats(count={}, mean={}, std={}, min={}, max={})'
+        return tmpl.format(self._count, self._mean, self.std, self._min,
+                           self._max)
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def variance(self):
+        if not self._count:
+            return None
+        return self._m2 / self._count
+
+    @property
+    def std(self):
+        if not self._count:
+            return None
+        return np.sqrt(self._m2 / self._count)
+
+    @property
+    def min(self):
+        return self._min
+
+    @property
+    def min_time(self):
+        return _time(self._min_time)
+
+    @property
+    def max(self):
+        return self._max
+
+    @property
+    def max_time(self):
+        return _time(self._max_time)
+
+    @property
+    def first(self):
+        return self._first
+
+    @property
+    def first_time(self):
+        return _time(self._first_time)
+
+    @property
+    def last(self):
+        return self._last
+
+    @property
+    def last_time(self):
+        return _time(self._last_time)
+
+    def to_dict(self):
+        """Plain (JSON serializable) representation of the statistics.
+
+        :return : Dictionary of the statistics
+        :rtype  : dict
+        """
+        fields = {}
+        for name in STATE:
+            value = getattr(self, '_' + name)
+            if value is not None:
+                value = np.asarray(value).tolist()
+            fields[name] = value
+        return fields
+
+    @classmethod
+    def from_dict(cls, fields):
+        """Rebuild statistics from their to_dict representation.
+
+        :param fields : Dictionary of the statistics
+        :type  fields : dict
+        :return       : Statistics
+        :rtype        : RunningStats
+        """
+        stats = cls()
+        for name in STATE:
+            value = fields.get(name)
+            if isinstance(value, list):
+                value = np.array(value)
+            setattr(stats, '_' + name, value)
+        stats._count = int(stats._count or 0)
+        return stats
+
+    def update(self, epoch, value):
+        """Add one reading.
+
+        :param epoch : Time of the reading in seconds since the epoch
+        :type  epoch : int
+        :param value : Value of the reading
+        :type  value : float
+        :return      : None
+        :rtype       : None
+        """
+        if np.ndim(value):
+            self.update_batch([epoch], [value])
+            return
+
+        self._count += 1
+        if self._count == 1:
+            self._mean = value
+            self._m2 = 0.0
+            self._min = self._max = self._first = self._last = value
+            self._min_time = self._max_time = epoch
+            self._first_time = self._last_time = epoch
+            return
+
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+
+        if value < self._min:
+            self._min = value
+            self._min_time = epoch
+        if value > self._max:
+            self._max = value
+            self._max_time = epoch
+        if epoch < self._first_time:
+            self._first = value
+            self._first_time = epoch
+        if epoch >= self._last_time:
+            self._last = value
+            self._last_time = epoch
+
+    def update_batch(self, epochs, values):
+        """Add a batch of readings.
+
+        :param epochs : Times of the readings in seconds since the epoch
+        :type  epochs : np.ndarray
+        :param values : Values of the readings
+        :type  values : np.ndarray
+        :return       : None
+        :rtype        : None
+        """
+        self._absorb(RunningStats.from_arrays(epochs, values))
+
+    def merge(self, other):
+        """Combine with the statistics of another set of readings.
+
+        :param other : Statistics to combine with
+        :type  other : RunningStats
+        :return      : Statistics of both sets of readings
+        :rtype       : RunningStats
+        """
+        merged = RunningStats()
+        merged._absorb(self)
+        merged._absorb(other)
+        return merged
+
+    @classmethod
+    def from_arrays(cls, epochs, values):
+        """Compute the statistics of a batch of readings.
+
+        :param epochs : Times of the readings in seconds since the epoch
+        :type  epochs : np.ndarray
+        :param values : Values of the readings
+        :type  values : np.ndarray
+        :return       : Statistics of the readings
+        :rtype        : RunningStats
+        """
+        stats = cls()
+        n = len(epochs)
+        if not n:
+            return stats
+
+        epochs = np.asarray(epochs, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        stats._count = n
+        stats._mean = values.mean(axis=0)
+        stats._m2 = ((values - stats._mean) ** 2).sum(axis=0)
+
+        stats._min = values.min(axis=0)
+        stats._min_time = epochs[values.argmin(axis=0)]
+        stats._max = values.max(axis=0)
+        stats._max_time = epochs[values.argmax(axis=0)]
+
+        first = epochs.argmin()
+        last = n - 1 - epochs[::-1].argmax()
+        stats._first = values[first]
+        stats._first_time = epochs[first]
+        stats._last = values[last]
+        stats._last_time = epochs[last]
+        return stats
+
+    def _absorb(self, other):
+        # Merge other into self (Chan et al. parallel variance)
+        if not other._count:
+            return
+        if not self._count:
+            self.__dict__.update(other.__dict__)
+            return
+
+        a = self._count
+        b = other._count
+        n = a + b
+        delta = other._mean - self._mean
+        self._mean = self._mean + delta * b / float(n)
+        self._m2 = self._m2 + other._m2 + delta * delta * a * b / float(n)
+        self._count = n
+
+        lower = other._min < self._min
+        self._min = _pick(lower, other._min, self._min)
+        self._min_time = _pick(lower, other._min_time, self._min_time)
+
+        higher = other._max > self._max
+        self._max = _pick(higher, other._max, self._max)
+        self._max_time = _pick(higher, other._max_time, self._max_time)
+
+        if other._first_time < self._first_time:
+            self._first = other._first
+            self._first_time = other._first_time
+        if other._last_time >= self._last_time:
+            self._last = other._last
+            self._last_time = other._last_time
+
+
+def merge_stats(stats):
+    """Combine the statistics of several sets of readings.
+
+    :param stats : RunningStats objects to combine
+    :type  stats : list
+    :return      : Statistics of all the readings
+    :rtype       : RunningStats
+    """
+    merged = RunningStats()
+    for other in stats:
+        merged._absorb(other)
+    return merged